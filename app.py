@@ -1,21 +1,66 @@
 import os
 import re
 import io
+import sys
+import bisect
+import heapq
 import zipfile
 import threading
 import uuid
+import json
+import sqlite3
+import hashlib
+import struct
+import zlib
 import shutil
-import pandas as pd
+import importlib
 import time
+import itertools
+import multiprocessing
 import urllib.request
-from flask import Flask, render_template, request, send_file, redirect, url_for, send_from_directory, jsonify
-from PIL import Image, ImageDraw, ImageFont
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from flask import Flask, Response, g, render_template, request, send_file, redirect, url_for, send_from_directory, jsonify
 from werkzeug.utils import secure_filename
 
+
+class _LazyModule:
+    """Stands in for a module until its first attribute access imports it.
+
+    The import rebinds the module's name in this file, so later lookups go
+    straight to the module.
+    """
+
+    def __init__(self, alias, name):
+        self._alias = alias
+        self._name = name
+
+    def load(self):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+# These dominate import time; with LAZY_START they load on first use or in warm_up()
+np = _LazyModule("np", "numpy")
+pd = _LazyModule("pd", "pandas")
+openpyxl = _LazyModule("openpyxl", "openpyxl")
+Image = _LazyModule("Image", "PIL.Image")
+ImageDraw = _LazyModule("ImageDraw", "PIL.ImageDraw")
+ImageFont = _LazyModule("ImageFont", "PIL.ImageFont")
+HEAVY_MODULES = (np, pd, openpyxl, Image, ImageDraw, ImageFont)
+
 BASE_DIR =os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)),"app")
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 OUTPUT_FOLDER = os.path.join(BASE_DIR, "outputs")
-print(BASE_DIR)
+DATASET_CACHE_FOLDER = os.path.join(BASE_DIR, "cache", "datasets")
+RENDER_CACHE_FOLDER = os.path.join(BASE_DIR, "cache", "renders")
+PROFILE_FOLDER = os.path.join(BASE_DIR, "cache", "profiles")
 # Use the provided font in the repository (outside the app directory)
 FONT_PATH = os.path.join(BASE_DIR, "fonts", "Product Sans Regular.ttf")
 FONTS_DIRS = [
@@ -25,15 +70,57 @@ FONTS_DIRS = [
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(DATASET_CACHE_FOLDER, exist_ok=True)
+os.makedirs(RENDER_CACHE_FOLDER, exist_ok=True)
+os.makedirs(PROFILE_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-# In-memory job registry for async generation progress
-JOBS = {}
-JOBS_LOCK = threading.Lock()
+# Job registry for async generation progress: "memory" (this process only) or
+# "sqlite" (shared by every worker process that can reach JOB_STORE_PATH)
+JOB_STORE = os.environ.get("JOB_STORE", "memory")
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", os.path.join(BASE_DIR, "jobs.sqlite3"))
 JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "600"))  # 10 minutes after done
+# Set by cli.py and the benchmarks, which render in their own process: no janitor, queue
+# workers or keepalive, and jobs and the queue are kept in memory, so the web app's shared
+# store and queue file are never opened. Render pool workers import this module afresh
+# (see get_render_pool); they are headless too and load only the modules rendering touches
+RENDER_WORKER = multiprocessing.current_process().name != "MainProcess"
+HEADLESS = os.environ.get("CERTGEN_HEADLESS") == "1" or RENDER_WORKER
+# Defer pandas/Pillow to first use and the background threads to the first request, then
+# warm imports, fonts and the render pool after the first response: a woken instance answers sooner
+LAZY_START = os.environ.get("LAZY_START", "") in ("1", "true", "yes")
 JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "3600"))  # 1 hour if stuck running
+JOB_RECONCILE_SECONDS = int(os.environ.get("JOB_RECONCILE_SECONDS", "600"))  # full scan for other processes' jobs and orphans
+CACHE_SWEEP_SECONDS = 60  # how often unused dataset/render cache entries and old profiles are evicted
+
+# Render engine: rows are split into shards and rendered on a process pool
+# Job scheduler: how many jobs render at once and how many may wait in the queue
+JOB_WORKERS = max(1, int(os.environ.get("JOB_WORKERS", "2")))
+JOB_QUEUE_LIMIT = max(1, int(os.environ.get("JOB_QUEUE_LIMIT", "100")))
+# Queued jobs survive restarts; shared between processes with JOB_STORE=sqlite
+JOB_QUEUE_DB = f"file:certgen-queue-{os.getpid()}?mode=memory&cache=shared" if HEADLESS else JOB_STORE_PATH
+JOB_LEASE_SECONDS = 60  # a running job whose owner stops heartbeating is re-queued after this
+JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", "0.1"))  # min seconds between progress writes per job
+PROGRESS_STREAM_INTERVAL = float(os.environ.get("PROGRESS_STREAM_INTERVAL", "0.25"))  # min seconds between SSE updates
+PROGRESS_STREAM_KEEPALIVE = 15  # seconds between SSE comments while nothing changes
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", str(os.cpu_count() or 1)))  # <= 1 renders inline
+RENDER_SHARD_SIZE = max(1, int(os.environ.get("RENDER_SHARD_SIZE", "50")))  # rows per shard
+DATASET_CACHE_TTL_SECONDS = int(os.environ.get("DATASET_CACHE_TTL_SECONDS", "3600"))  # since last use
+DATASET_STREAM_MB = float(os.environ.get("DATASET_STREAM_MB", "20"))  # bigger uploads are read in chunks
+DATASET_CHUNK_ROWS = max(1, int(os.environ.get("DATASET_CHUNK_ROWS", "5000")))  # rows per chunk when streaming
+DATASET_MEMORY_ITEMS = max(0, int(os.environ.get("DATASET_MEMORY_ITEMS", "4")))  # parsed frames kept in RAM
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_MB", "0")) * 1024 * 1024  # opt-in; 0 disables the cache
+RENDER_CACHE_TTL_SECONDS = int(os.environ.get("RENDER_CACHE_TTL_SECONDS", str(DATASET_CACHE_TTL_SECONDS)))
+RENDER_MODE = os.environ.get("RENDER_MODE", "region")  # "region" redraws text bands only, "full" whole pages
+PREVIEW_MAX_WIDTH = int(os.environ.get("PREVIEW_MAX_WIDTH", "1600"))  # previews are downscaled to this width
+PREVIEW_CACHE_ITEMS = max(1, int(os.environ.get("PREVIEW_CACHE_ITEMS", "8")))  # scaled templates kept in RAM
+FONT_CACHE_SIZE = max(1, int(os.environ.get("FONT_CACHE_SIZE", "64")))  # parsed (font, size) pairs kept
+TEXT_SPRITE_CACHE_BYTES = int(float(os.environ.get("TEXT_SPRITE_CACHE_MB", "32")) * 1024 * 1024)  # 0 disables
+JOB_PROFILING = os.environ.get("JOB_PROFILING", "") in ("1", "true", "yes")  # allow profile=true on /start_generate
+JOB_PROFILE_INTERVAL = float(os.environ.get("JOB_PROFILE_INTERVAL", "0.005"))  # seconds between stack samples
 
 # UI/branding links (override via env if needed)
 CONTRIBUTOR_NAME = os.environ.get("CONTRIBUTOR_NAME", "Inukurthi Bharath Kumar")
@@ -67,6 +154,297 @@ def inject_globals():
         GITHUB_URL=GITHUB_URL,
         GDG_NAME=GDG_NAME,
     )
+class JobEvents:
+    """Wakes progress streams in this process whenever a job is written, and tells listeners which.
+
+    Listeners are called as listener(job_id, job) after every write, with job None
+    once it is deleted.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = 0
+        self.listeners = []
+
+    def notify(self, job_id=None, job=None):
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+        for listener in self.listeners:
+            listener(job_id, job)
+
+    def wait(self, version, timeout):
+        """Block until something changed since version (or timeout); returns the current version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+
+class MemoryJobStore:
+    """Job registry held in this process. Readers get copies; writes go through the store."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.events = JobEvents()
+
+    def create(self, job_id, job):
+        with self._lock:
+            self._jobs[job_id] = dict(job)
+        self.events.notify(job_id, job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.update(fields)
+        self.events.notify(job_id, job)
+        return True
+
+    def delete(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        self.events.notify(job_id)
+        return job
+
+    def items(self):
+        with self._lock:
+            return [(job_id, dict(job)) for job_id, job in self._jobs.items()]
+
+
+class SqliteJobStore:
+    """Job registry in a SQLite file so every gunicorn worker (or node sharing the file) sees it.
+
+    events only fire for writes made by this process; streams poll for the rest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.events = JobEvents()
+        with self._db() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _db(self):
+        return _SqliteTransaction(self._conn())
+
+    def create(self, job_id, job):
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?)", (job_id, json.dumps(job)))
+        self.events.notify(job_id, job)
+
+    def get(self, job_id):
+        # Reads run outside a transaction: WAL readers never wait for the writer
+        row = self._conn().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _modify(self, job_id, change):
+        with self._db() as db:
+            row = db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            change(job)
+            db.execute("UPDATE jobs SET data = ? WHERE job_id = ?", (json.dumps(job), job_id))
+        self.events.notify(job_id, job)
+        return job
+
+    def update(self, job_id, **fields):
+        return self._modify(job_id, lambda job: job.update(fields)) is not None
+
+    def delete(self, job_id):
+        with self._db() as db:
+            row = db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        self.events.notify(job_id)
+        return json.loads(row[0]) if row else None
+
+    def items(self):
+        rows = self._conn().execute("SELECT job_id, data FROM jobs").fetchall()
+        return [(job_id, json.loads(data)) for job_id, data in rows]
+
+
+class _SqliteTransaction:
+    """Run a block inside BEGIN IMMEDIATE ... COMMIT on an autocommit connection."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def make_job_store():
+    if JOB_STORE == "sqlite" and not HEADLESS:
+        return SqliteJobStore(JOB_STORE_PATH)
+    return MemoryJobStore()
+
+
+JOBS = make_job_store()
+
+
+# Per-row render time histogram bounds in seconds (Prometheus "le" buckets)
+ROW_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Set by benchmarks/pipeline.py: also keep every row's time, for exact quantiles
+ROW_SAMPLES = os.environ.get("CERTGEN_ROW_SAMPLES") == "1"
+
+
+class Timings:
+    """Seconds spent per pipeline stage plus a histogram of per-row render time.
+
+    Render shards return one from the worker processes and the job merges them,
+    so the per-row cost is a few additions.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.buckets = [0] * (len(ROW_SECONDS_BUCKETS) + 1)  # the last bucket is +Inf
+        self.row_seconds = 0.0
+        self.row_samples = [] if ROW_SAMPLES else None
+        self.counts = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def observe_row(self, seconds):
+        self.buckets[bisect.bisect_left(ROW_SECONDS_BUCKETS, seconds)] += 1
+        self.row_seconds += seconds
+        if self.row_samples is not None:
+            self.row_samples.append(seconds)
+
+    def merge(self, other):
+        for stage, seconds in other.stages.items():
+            self.add(stage, seconds)
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count
+        self.row_seconds += other.row_seconds
+        if self.row_samples is not None and other.row_samples:
+            self.row_samples.extend(other.row_samples)
+        for name, n in other.counts.items():
+            self.count(name, n)
+
+    def cumulative_buckets(self):
+        """[(upper bound label, rows at or under it)] the way Prometheus reports histograms."""
+        bounds = [f"{b:g}" for b in ROW_SECONDS_BUCKETS] + ["+Inf"]
+        return list(zip(bounds, itertools.accumulate(self.buckets)))
+
+    def as_dict(self):
+        row_seconds = {
+            "buckets": self.cumulative_buckets(),
+            "sum": round(self.row_seconds, 4),
+            "count": sum(self.buckets),
+        }
+        if self.row_samples is not None:
+            row_seconds["samples"] = list(self.row_samples)
+        return {
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            "row_seconds": row_seconds,
+            "counts": dict(self.counts),
+        }
+
+
+def _timed(iterable, timings, stage):
+    """Yield from iterable, adding the time spent producing each item (not consuming it) to stage."""
+    it = iter(iterable)
+    end = object()
+    while True:
+        start = time.perf_counter()
+        item = next(it, end)
+        timings.add(stage, time.perf_counter() - start)
+        if item is end:
+            return
+        yield item
+
+
+class Metrics:
+    """Counters and stage timings of this process, exposed on /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = Timings()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_timings(self, timings):
+        with self._lock:
+            self._timings.merge(timings)
+
+    def snapshot(self):
+        """(counters keyed by (name, labels), copy of the accumulated Timings)."""
+        timings = Timings()
+        with self._lock:
+            timings.merge(self._timings)
+            return dict(self._counters), timings
+
+
+METRICS = Metrics()
+
+
+class StackSampler:
+    """Sampling profiler for one thread: records its Python stack every interval seconds.
+
+    Samples are written in collapsed-stack format ("outer;inner count" per line),
+    which flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, thread_id, interval=JOB_PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path + PARTIAL_SUFFIX, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(path + PARTIAL_SUFFIX, path)
+
+
 def normalize_filename_value(value):
     if value is None:
         return None
@@ -90,39 +468,158 @@ def normalize_filename_value(value):
     s = re.sub(r'[\\/*?:"<>|]+', '_', s)
     return s or None
 
-def load_font(size, font_filename: str | None = None):
-    # Try a specifically selected font first
+# Parsed FreeType fonts keyed by (path, size); LRU-evicted beyond FONT_CACHE_SIZE
+_FONT_CACHE = OrderedDict()
+_FONT_CACHE_LOCK = threading.Lock()
+_FONT_CACHE_STATS = {"hits": 0, "misses": 0}
+# Resolved path for each requested font filename (None = default font)
+_FONT_PATHS = {}
+# (mtime, size) of each font file when it was first parsed, to notice a file replaced on disk
+_FONT_STAMPS = {}
+
+
+def _font_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _font_candidates(font_filename):
+    paths = []
     if font_filename:
-        # Absolute path support
-        if os.path.isabs(font_filename) and os.path.exists(font_filename):
-            try:
-                return ImageFont.truetype(font_filename, size)
-            except Exception:
-                pass
-        # Search known font directories
-        for d in FONTS_DIRS:
-            try:
-                candidate = os.path.join(d, font_filename)
-                if os.path.exists(candidate):
-                    return ImageFont.truetype(candidate, size)
-            except Exception:
-                continue
+        # Absolute path support, then known font directories
+        if os.path.isabs(font_filename):
+            paths.append(font_filename)
+        paths.extend(os.path.join(d, font_filename) for d in FONTS_DIRS)
     # Fallback candidates
-    candidates = [
+    paths.extend([
         FONT_PATH,
         os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "fonts", "Product Sans Regular.ttf")),
         os.path.abspath(os.path.join(os.path.dirname(__file__), "fonts", "Product Sans Regular.ttf")),
-    ]
-    for path in candidates:
+    ])
+    return paths
+
+
+def _cached_truetype(path, size):
+    key = (path, size)
+    with _FONT_CACHE_LOCK:
+        font = _FONT_CACHE.get(key)
+        if font is not None:
+            _FONT_CACHE.move_to_end(key)
+            _FONT_CACHE_STATS["hits"] += 1
+            return font
+        _FONT_CACHE_STATS["misses"] += 1
+    stamp = _font_stamp(path)
+    try:
+        font = ImageFont.truetype(path, size)
+    except Exception:
+        return None
+    with _FONT_CACHE_LOCK:
+        _FONT_STAMPS.setdefault(path, stamp)
+        _FONT_CACHE[key] = font
+        while len(_FONT_CACHE) > FONT_CACHE_SIZE:
+            _FONT_CACHE.popitem(last=False)
+    return font
+
+
+def load_font(size, font_filename: str | None = None):
+    # Fast path: font name already resolved to a file on disk
+    path = _FONT_PATHS.get(font_filename)
+    if path is not None:
+        font = _cached_truetype(path, size)
+        if font is not None:
+            return font
+    for path in _font_candidates(font_filename):
+        if os.path.exists(path):
+            font = _cached_truetype(path, size)
+            if font is not None:
+                with _FONT_CACHE_LOCK:
+                    _FONT_PATHS[font_filename] = path
+                return font
+    font = _cached_truetype("arial.ttf", size)
+    if font is not None:
+        with _FONT_CACHE_LOCK:
+            _FONT_PATHS[font_filename] = "arial.ttf"
+        return font
+    return ImageFont.load_default()
+
+
+def resolve_font_path(font_filename=None):
+    """Path of the TrueType file load_font uses for font_filename, or None for the bitmap default."""
+    load_font(1, font_filename)
+    with _FONT_CACHE_LOCK:
+        path = _FONT_PATHS.get(font_filename)
+    return path if path and os.path.isabs(path) else None
+
+
+def invalidate_font_cache(font_filename=None):
+    """Forget cached fonts, and text rasterised with them, for font_filename (or every font when None)."""
+    with _FONT_CACHE_LOCK:
+        if font_filename is None:
+            _FONT_CACHE.clear()
+            _FONT_PATHS.clear()
+            _FONT_STAMPS.clear()
+        else:
+            for key in [k for k in _FONT_CACHE if os.path.basename(k[0]) == font_filename]:
+                del _FONT_CACHE[key]
+            for name in [n for n, p in _FONT_PATHS.items() if n == font_filename or os.path.basename(p) == font_filename]:
+                del _FONT_PATHS[name]
+            for path in [p for p in _FONT_STAMPS if os.path.basename(p) == font_filename]:
+                del _FONT_STAMPS[path]
+    _drop_text_sprites(font_filename)
+
+
+def stale_font_path(font_filename=None):
+    """Path of the cached face for font_filename if the font dirs no longer hold that file as parsed, else None.
+
+    Fonts are uploaded through the app process; render workers only see the change on disk.
+    """
+    with _FONT_CACHE_LOCK:
+        path = _FONT_PATHS.get(font_filename)
+        stamp = _FONT_STAMPS.get(path)
+    if path is None:
+        return None
+    current = next((p for p in _font_candidates(font_filename) if os.path.exists(p)), path)
+    if current != path or _font_stamp(path) != stamp:
+        return path
+    return None
+
+
+def font_cache_stats():
+    with _FONT_CACHE_LOCK:
+        return {
+            "hits": _FONT_CACHE_STATS["hits"],
+            "misses": _FONT_CACHE_STATS["misses"],
+            "size": len(_FONT_CACHE),
+            "max_size": FONT_CACHE_SIZE,
+        }
+
+
+def save_uploaded_font(file):
+    """Store an uploaded .ttf in the first writable font dir; returns its filename or None."""
+    if not file or not file.filename.lower().endswith('.ttf'):
+        return None
+    fname = secure_filename(file.filename)
+    data = file.read()
+    for d in FONTS_DIRS:
+        path = os.path.join(d, fname)
         try:
-            if os.path.exists(path):
-                return ImageFont.truetype(path, size)
+            # Previews resend the font on every click; an identical copy (and its cached faces) stays
+            if os.path.isfile(path) and os.path.getsize(path) == len(data):
+                with open(path, "rb") as f:
+                    if f.read() == data:
+                        return fname
+            os.makedirs(d, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
         except Exception:
             continue
-    try:
-        return ImageFont.truetype("arial.ttf", size)
-    except Exception:
-        return ImageFont.load_default()
+        # A font with the same name may already be cached; drop it
+        invalidate_font_cache(fname)
+        return fname
+    return None
 
 def list_available_fonts():
     found = []
@@ -145,6 +642,1412 @@ def list_available_fonts():
     return found
 
 
+def read_dataset(data_path, headers_present):
+    """Parse an uploaded CSV/XLSX file (uncached)."""
+    if data_path.endswith(".csv"):
+        return pd.read_csv(data_path, header=0 if headers_present else None)
+    return pd.read_excel(data_path, header=0 if headers_present else None)
+
+
+# Parsed datasets are pickled under DATASET_CACHE_FOLDER keyed by content hash, so
+# every route (and every process) parses a given upload at most once.
+_DATASET_MEMORY = OrderedDict()
+_DATASET_HASHES = {}
+_DATASET_LOCK = threading.Lock()
+
+
+def _dataset_digest(data_path):
+    st = os.stat(data_path)
+    stamp = (data_path, st.st_mtime_ns, st.st_size)
+    with _DATASET_LOCK:
+        digest = _DATASET_HASHES.get(stamp)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(data_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _DATASET_LOCK:
+            _DATASET_HASHES[stamp] = digest
+    return digest
+
+
+def load_dataset(data_filename, headers_present):
+    """Return the parsed dataframe for an upload, parsing the file only on a cache miss."""
+    data_path = os.path.join(UPLOAD_FOLDER, data_filename)
+    key = f"{_dataset_digest(data_path)}-{'h' if headers_present else 'n'}"
+    with _DATASET_LOCK:
+        df = _DATASET_MEMORY.get(key)
+        if df is not None:
+            _DATASET_MEMORY.move_to_end(key)
+    cache_path = os.path.join(DATASET_CACHE_FOLDER, key + ".pkl")
+    result = "hit"
+    if df is None:
+        try:
+            df = pd.read_pickle(cache_path)
+        except Exception:
+            result = "miss"
+            df = read_dataset(data_path, headers_present)
+            try:
+                tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+                df.to_pickle(tmp_path)
+                os.replace(tmp_path, cache_path)
+            except Exception:
+                pass
+        if DATASET_MEMORY_ITEMS:
+            with _DATASET_LOCK:
+                _DATASET_MEMORY[key] = df
+                while len(_DATASET_MEMORY) > DATASET_MEMORY_ITEMS:
+                    _DATASET_MEMORY.popitem(last=False)
+    METRICS.inc("certgen_cache_requests_total", cache="dataset", result=result)
+    # Mark as recently used for the janitor's TTL
+    try:
+        os.utime(cache_path)
+    except Exception:
+        pass
+    return df
+
+
+def _evict_dataset_cache(now):
+    """Drop cached datasets that have not been used for DATASET_CACHE_TTL_SECONDS."""
+    try:
+        names = os.listdir(DATASET_CACHE_FOLDER)
+    except Exception:
+        return
+    for name in names:
+        fp = os.path.join(DATASET_CACHE_FOLDER, name)
+        try:
+            if (now - os.path.getmtime(fp)) > DATASET_CACHE_TTL_SECONDS:
+                os.remove(fp)
+                with _DATASET_LOCK:
+                    _DATASET_MEMORY.pop(name.rsplit(".", 1)[0], None)
+        except Exception:
+            continue
+    with _DATASET_LOCK:
+        for stamp in [st for st in _DATASET_HASHES if not os.path.exists(st[0])]:
+            del _DATASET_HASHES[stamp]
+
+
+# Uploads larger than DATASET_STREAM_MB are never parsed whole: jobs read them in
+# chunks of DATASET_CHUNK_ROWS, so rendering starts on the first chunk and memory
+# stays flat however many rows the sheet has.
+def is_streamed(data_path):
+    return os.path.getsize(data_path) > DATASET_STREAM_MB * 1024 * 1024
+
+
+def iter_dataset(data_path, headers_present, chunk_rows=DATASET_CHUNK_ROWS):
+    """Yield an upload as dataframes of at most chunk_rows rows (at least one, possibly empty).
+
+    The index runs on across chunks like a whole-file parse. CSV values are kept as
+    the text in the file, since dtypes guessed per chunk could disagree.
+    """
+    header = 0 if headers_present else None
+    if data_path.endswith(".csv"):
+        yield from pd.read_csv(data_path, header=header, chunksize=chunk_rows, dtype=str)
+        return
+    wb = openpyxl.load_workbook(data_path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        columns = None
+        if headers_present:
+            names = next(rows, None) or ()
+            columns = _header_names(names)
+        start = 0
+        first = True
+        while True:
+            raw = list(itertools.islice(rows, chunk_rows))
+            # Blank rows (often just formatting) are skipped like pandas does
+            batch = [row for row in raw if any(v is not None for v in row)]
+            if batch or first:
+                if columns is None:
+                    columns = list(range(max((len(row) for row in batch), default=0)))
+                width = len(columns)
+                batch = [tuple(row[:width]) + (None,) * (width - len(row)) for row in batch]
+                yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch)))
+                start += len(batch)
+                first = False
+            if len(raw) < chunk_rows:
+                return
+    finally:
+        wb.close()
+
+
+def _header_names(values):
+    """Column labels for a header row, named and de-duplicated the way pandas does."""
+    names = []
+    seen = {}
+    for i, value in enumerate(values):
+        name = f"Unnamed: {i}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def open_dataset(data_filename, headers_present):
+    """(columns, iterator of dataframes) for an upload: the cached frame, or chunks for large files."""
+    data_path = os.path.join(UPLOAD_FOLDER, data_filename)
+    if not is_streamed(data_path):
+        df = load_dataset(data_filename, headers_present)
+        return df.columns, iter([df])
+    chunks = iter_dataset(data_path, headers_present)
+    first = next(chunks)
+    return first.columns, itertools.chain([first], chunks)
+
+
+def count_dataset_rows(data_filename, headers_present):
+    """Number of data rows, counted without parsing large uploads.
+
+    CSV line counts ignore quoted newlines and XLSX uses the sheet's stored
+    dimension, so for streamed files this is an estimate that jobs correct when
+    they finish.
+    """
+    data_path = os.path.join(UPLOAD_FOLDER, data_filename)
+    if not is_streamed(data_path):
+        return len(load_dataset(data_filename, headers_present))
+    if data_path.endswith(".csv"):
+        lines = 0
+        last = b"\n"
+        with open(data_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                lines += block.count(b"\n")
+                last = block[-1:]
+        if last != b"\n":
+            lines += 1
+    else:
+        wb = openpyxl.load_workbook(data_path, read_only=True)
+        try:
+            lines = wb.worksheets[0].max_row or 0
+        finally:
+            wb.close()
+    return max(0, lines - (1 if headers_present else 0))
+
+
+# Output encodings and their file extensions
+OUTPUT_FORMATS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp", "pdf": ".pdf"}
+DEFAULT_OUTPUT = {"format": "png", "compress_level": 6, "quality": 90}
+
+# Memoised text placements per compiled layout before the memo is reset
+TEXT_METRICS_CACHE_SIZE = 10000
+TEXT_FILL = (0, 0, 0, 255)
+AUTO_FIT_MIN_SIZE = 6  # auto-fitted text never shrinks below this many pixels
+
+# Rasterised masks of repeated text (event names, dates, ...) keyed by font file,
+# face index, size and text, shared by every job in the process. Drawing one is a
+# paste through the mask instead of a FreeType rasterisation per certificate, with
+# identical pixels. Masks hold coverage only, so any fill can use them.
+TEXT_SPRITE_MIN_REPEATS = 4  # a column is drawn from sprites if its values repeat this often on average
+TEXT_SPRITE_WARM_ITEMS = 256  # most common values per column rasterised before rendering starts
+_TEXT_SPRITES = OrderedDict()
+_TEXT_SPRITES_LOCK = threading.Lock()
+_text_sprite_bytes = 0
+
+
+def text_sprite(font, text):
+    """((mask, (left, top)), hit) for text drawn at the origin, or (None, False) for fonts that cannot be cached.
+
+    The mask goes at (x + left, y + top) for text drawn at (x, y).
+    """
+    global _text_sprite_bytes
+    path = getattr(font, "path", None)
+    if path is None or TEXT_SPRITE_CACHE_BYTES <= 0:
+        return None, False
+    key = (path, font.index, font.size, text)
+    with _TEXT_SPRITES_LOCK:
+        sprite = _TEXT_SPRITES.get(key)
+        if sprite is not None:
+            _TEXT_SPRITES.move_to_end(key)
+            return sprite, True
+    left, top, right, bottom = font.getbbox(text)
+    mask = Image.new("L", (max(0, right - left), max(0, bottom - top)))
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+    sprite = (mask, (left, top))
+    with _TEXT_SPRITES_LOCK:
+        if key not in _TEXT_SPRITES:
+            _TEXT_SPRITES[key] = sprite
+            _text_sprite_bytes += mask.width * mask.height
+            while _text_sprite_bytes > TEXT_SPRITE_CACHE_BYTES and _TEXT_SPRITES:
+                old, _ = _TEXT_SPRITES.popitem(last=False)[1]
+                _text_sprite_bytes -= old.width * old.height
+    return sprite, False
+
+
+def _drop_text_sprites(font_filename=None):
+    global _text_sprite_bytes
+    with _TEXT_SPRITES_LOCK:
+        for key in [k for k in _TEXT_SPRITES if font_filename is None or os.path.basename(k[0]) == font_filename]:
+            mask, _ = _TEXT_SPRITES.pop(key)
+            _text_sprite_bytes -= mask.width * mask.height
+
+
+class CompiledLayout:
+    """A job's layout resolved once against the template and the dataset columns.
+
+    items holds (column, dataframe key, font, anchor_x, anchor_y) for every column
+    that will be drawn, in form order. Rows are rendered from text tuples aligned
+    with items, so nothing is looked up by name in the per-row loop. Columns with a
+    max width (layout["max_widths"], a fraction of the template width) shrink
+    their font for texts that would not fit.
+    """
+
+    def __init__(self, layout, template, df_columns=None):
+        self.layout = layout
+        self.template_size = template.size
+        self.template_mode = template.mode
+        col_key_map = {str(c): c for c in df_columns} if df_columns is not None else None
+        self.columns = []
+        for col in layout["column_positions"]:
+            if col_key_map is None:
+                self.columns.append((col, None))
+            elif col in col_key_map:
+                self.columns.append((col, col_key_map[col]))
+        # Item index -> most common values, for columns drawn from the text-sprite cache
+        self.repeated = {}
+        self._compile()
+
+    def _compile(self):
+        img_w, img_h = self.template_size
+        column_positions = self.layout["column_positions"]
+        font_sizes = self.layout["font_sizes"]
+        font_filename = self.layout.get("font_filename")
+        max_widths = self.layout.get("max_widths") or {}
+        self.items = []
+        self._max_widths = {}
+        for i, (col, key) in enumerate(self.columns):
+            x_norm, y_norm = column_positions[col]
+            font = load_font(font_sizes.get(col, 40), font_filename)
+            self.items.append((col, key, font, x_norm * img_w, y_norm * img_h))
+            if max_widths.get(col) and getattr(font, "path", None):
+                self._max_widths[i] = max_widths[col] * img_w
+        # Measure with the template's mode so bboxes match what draw.text produces
+        self._measure = ImageDraw.Draw(Image.new(self.template_mode, (1, 1)))
+        self._origins = {}
+        self._advances = {}
+        self.sprite_hits = 0
+        self.sprite_misses = 0
+
+    # Fonts are not shipped to render workers; _render_shard re-resolves them once per
+    # worker per job, after checking the job's font is not stale
+    def __getstate__(self):
+        return {
+            "layout": self.layout,
+            "template_size": self.template_size,
+            "template_mode": self.template_mode,
+            "columns": self.columns,
+            "repeated": self.repeated,
+        }
+
+    def placement(self, i, text):
+        """Top-left draw position centring text on column i's anchor, its ink box and the font to draw it in."""
+        key = (i, text)
+        placed = self._origins.get(key)
+        if placed is None:
+            _, _, font, anchor_x, anchor_y = self.items[i]
+            if i in self._max_widths:
+                font = self.fit_font(i, text)
+            bbox = self._measure.textbbox((0, 0), text, font=font)
+            if i in self._max_widths:
+                # Kerning and hinting are not in the estimate; the real box settles it
+                while font.size > AUTO_FIT_MIN_SIZE and bbox[2] - bbox[0] > self._max_widths[i]:
+                    font = load_font(font.size - 1, self.layout.get("font_filename"))
+                    bbox = self._measure.textbbox((0, 0), text, font=font)
+            text_w = bbox[2] - bbox[0]
+            text_h = bbox[3] - bbox[1]
+            x = int(anchor_x - text_w / 2)
+            y = int(anchor_y - (text_h / 2 + bbox[1]))
+            placed = ((x, y), (x + bbox[0], y + bbox[1], x + bbox[2], y + bbox[3]), font)
+            if len(self._origins) >= TEXT_METRICS_CACHE_SIZE:
+                self._origins.clear()
+                self._advances.clear()
+            self._origins[key] = placed
+        return placed
+
+    def _estimated_width(self, size, text):
+        """Width of text at size as the sum of its glyph advances, each measured once per size."""
+        advances = self._advances.get(size)
+        if advances is None:
+            advances = self._advances[size] = {}
+        width = 0.0
+        font = None
+        for ch in text:
+            advance = advances.get(ch)
+            if advance is None:
+                if font is None:
+                    font = load_font(size, self.layout.get("font_filename"))
+                advance = advances[ch] = font.getlength(ch)
+            width += advance
+        return width
+
+    def fit_font(self, i, text):
+        """Column i's font at the largest size (up to the configured one) whose glyph advances fit its max width."""
+        font = self.items[i][2]
+        max_width = self._max_widths[i]
+        size = font.size
+        if self._estimated_width(size, text) > max_width:
+            # Binary search on the summed advances; no text layout per probe
+            lo, hi = min(AUTO_FIT_MIN_SIZE, size), size - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self._estimated_width(mid, text) <= max_width:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            font = load_font(lo, self.layout.get("font_filename"))
+        return font
+
+    def dirty_box(self, texts):
+        """Union of the ink boxes of texts, or None when nothing is drawn."""
+        box = None
+        for i, text in enumerate(texts):
+            if text is None:
+                continue
+            left, top, right, bottom = self.placement(i, text)[1]
+            if box is None:
+                box = [left, top, right, bottom]
+            else:
+                box = [min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)]
+        return box
+
+    def find_repeated(self, df):
+        """Pick the columns whose values repeat across df's rows (event, date, organiser, ...).
+
+        Those are drawn through the text-sprite cache; the rest, such as names, are
+        cheaper to rasterise directly than to cache.
+        """
+        self.repeated = {}
+        for i, (_, key, _, _, _) in enumerate(self.items):
+            if key is None:
+                continue
+            series = df[key]
+            counts = Counter(str(value) for value, missing in zip(series.tolist(), series.isna().tolist()) if not missing)
+            if counts and len(counts) * TEXT_SPRITE_MIN_REPEATS <= sum(counts.values()):
+                self.repeated[i] = [text for text, _ in counts.most_common(TEXT_SPRITE_WARM_ITEMS)]
+
+    def warm_sprites(self):
+        for i, texts in self.repeated.items():
+            for text in texts:
+                text_sprite(self.placement(i, text)[2], text)
+
+    def draw(self, image, texts, offset=(0, 0)):
+        """Draw texts onto image, whose top-left sits at offset in template coordinates."""
+        draw = None
+        dx, dy = offset
+        for i, text in enumerate(texts):
+            if text is None:
+                continue
+            (x, y), _, font = self.placement(i, text)
+            if i in self.repeated:
+                sprite, hit = text_sprite(font, text)
+                if sprite is not None:
+                    if hit:
+                        self.sprite_hits += 1
+                    else:
+                        self.sprite_misses += 1
+                    mask, (left, top) = sprite
+                    if mask.width and mask.height:
+                        image.paste(TEXT_FILL[:len(image.getbands())], (x + left - dx, y + top - dy), mask)
+                    continue
+            if draw is None:
+                draw = ImageDraw.Draw(image)
+            draw.text((x - dx, y - dy), text, fill=TEXT_FILL, font=font)
+
+
+def parse_column_settings(form):
+    """Read pos_<col>_x / pos_<col>_y / size_<col> fields into positions and sizes."""
+    column_positions = {}
+    font_sizes = {}
+    for key in form:
+        if key.startswith("pos_") and key.endswith("_x"):
+            col = key[len("pos_"):-2]
+            # robust parsing with defaults
+            try:
+                x = float(form.get(f"pos_{col}_x", 0.5))
+            except Exception:
+                x = 0.5
+            try:
+                y = float(form.get(f"pos_{col}_y", 0.5))
+            except Exception:
+                y = 0.5
+            try:
+                size = int(float(form.get(f"size_{col}", 40)))
+            except Exception:
+                size = 40
+            # clamp and store
+            x = 0 if x < 0 else (1 if x > 1 else x)
+            y = 0 if y < 0 else (1 if y > 1 else y)
+            size = max(1, size)
+            column_positions[col] = (x, y)
+            font_sizes[col] = size
+    return column_positions, font_sizes
+
+
+def parse_max_widths(form):
+    """Read the optional maxw_<col> fields (fraction of the template width, 0-1) into max widths."""
+    max_widths = {}
+    for key in form:
+        if key.startswith("maxw_"):
+            try:
+                width = float(form.get(key) or 0)
+            except Exception:
+                continue
+            if width > 0:
+                max_widths[key[len("maxw_"):]] = min(1.0, width)
+    return max_widths
+
+
+def parse_output_settings(form):
+    """Read output_format / png_compress_level / quality fields; bad values fall back to defaults."""
+    fmt = (form.get("output_format") or DEFAULT_OUTPUT["format"]).lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in OUTPUT_FORMATS:
+        fmt = DEFAULT_OUTPUT["format"]
+    try:
+        compress_level = int(form.get("png_compress_level", DEFAULT_OUTPUT["compress_level"]))
+    except Exception:
+        compress_level = DEFAULT_OUTPUT["compress_level"]
+    try:
+        quality = int(form.get("quality", DEFAULT_OUTPUT["quality"]))
+    except Exception:
+        quality = DEFAULT_OUTPUT["quality"]
+    return {
+        "format": fmt,
+        "compress_level": min(9, max(0, compress_level)),
+        "quality": min(100, max(1, quality)),
+    }
+
+
+# Saved layouts: the options form as JSON, for /api/jobs and cli.py
+#   {"columns": {"name": {"x": 0.5, "y": 0.4, "size": 40, "max_width": 0.6}}, "font": "Product Sans Regular.ttf",
+#    "file_column": "name", "headers_present": true,
+#    "output": {"format": "png", "compress_level": 6, "quality": 90}}
+def layout_to_dict(column_positions, font_sizes, font_filename, file_column, headers_present, output, max_widths=None):
+    columns = {}
+    for col, (x, y) in column_positions.items():
+        columns[col] = {"x": x, "y": y, "size": font_sizes.get(col, 40)}
+        if max_widths and col in max_widths:
+            columns[col]["max_width"] = max_widths[col]
+    return {
+        "columns": columns,
+        "font": font_filename,
+        "file_column": file_column or None,
+        "headers_present": headers_present,
+        "output": output,
+    }
+
+
+def parse_layout(spec):
+    """Validate a saved layout the same way as the options form; raises ValueError if it is not one.
+
+    Returns a dict with column_positions, font_sizes, max_widths, font_filename,
+    file_column, headers_present and output.
+    """
+    columns = spec.get("columns") if isinstance(spec, dict) else None
+    if not isinstance(columns, dict) or not columns:
+        raise ValueError('a layout needs a non-empty "columns" object')
+    form = {}
+    for col, setting in columns.items():
+        if not isinstance(setting, dict):
+            raise ValueError(f"column {col!r} needs an object with x, y and size")
+        form[f"pos_{col}_x"] = setting.get("x", 0.5)
+        form[f"pos_{col}_y"] = setting.get("y", 0.5)
+        form[f"size_{col}"] = setting.get("size", 40)
+        form[f"maxw_{col}"] = setting.get("max_width")
+    column_positions, font_sizes = parse_column_settings(form)
+    output = spec.get("output") or {}
+    if not isinstance(output, dict):
+        raise ValueError('"output" must be an object')
+    output = parse_output_settings({
+        "output_format": output.get("format"),
+        "png_compress_level": output.get("compress_level"),
+        "quality": output.get("quality"),
+    })
+    return {
+        "column_positions": column_positions,
+        "font_sizes": font_sizes,
+        "max_widths": parse_max_widths(form),
+        "font_filename": spec.get("font") or None,
+        "file_column": spec.get("file_column") or None,
+        "headers_present": bool(spec.get("headers_present", True)),
+        "output": output,
+    }
+
+
+def render_certificate(template, compiled, texts):
+    """Draw texts (aligned with compiled.items) onto a copy of template."""
+    base = template.copy()
+    compiled.draw(base, texts)
+    return base
+
+
+def collect_rows(df, compiled, file_column):
+    """Turn the dataframe into picklable (out_name, texts) render tasks.
+
+    Columns are extracted whole (values, NaN mask, filenames) instead of walking
+    df.iterrows(), which builds a Series per row.
+    """
+    col_key_map = {str(c): c for c in df.columns}
+    texts_by_column = []
+    for _, key, _, _, _ in compiled.items:
+        series = df[key]
+        texts_by_column.append([
+            None if missing else str(value)
+            for value, missing in zip(series.tolist(), series.isna().tolist())
+        ])
+    if texts_by_column:
+        texts = list(zip(*texts_by_column))
+    else:
+        texts = [()] * len(df)
+
+    indexes = df.index.tolist()
+    if file_column and file_column in col_key_map:
+        # Normalise each distinct value once
+        names = {}
+        candidates = []
+        for value in df[col_key_map[file_column]].tolist():
+            if value not in names:
+                names[value] = normalize_filename_value(value)
+            candidates.append(names[value])
+    else:
+        candidates = [None] * len(df)
+    ext = OUTPUT_FORMATS[compiled.layout.get("output", DEFAULT_OUTPUT)["format"]]
+    out_names = [
+        f"{candidate}{ext}" if candidate else f"generated_{idx}{ext}"
+        for idx, candidate in zip(indexes, candidates)
+    ]
+    return list(zip(out_names, texts))
+
+
+# Region rendering: the template is split into bands of this many scanlines
+REGION_TILE_ROWS = 32
+# Extra scanlines kept around the text ink box when picking dirty bands
+REGION_MARGIN = 2
+
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def _adler32_combine(adler1, adler2, len2):
+    """zlib's adler32_combine: checksum of A+B from the checksums of A and B."""
+    base = 65521
+    rem = len2 % base
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % base
+    sum1 += (adler2 & 0xFFFF) + base - 1
+    sum2 += ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + base - rem
+    sum1 %= base
+    sum2 %= base
+    return sum1 | (sum2 << 16)
+
+
+class RegionEncoder:
+    """PNG encoder that redraws and recompresses only the bands text touches.
+
+    The template is cut into horizontal tiles of REGION_TILE_ROWS scanlines. Each
+    tile is filtered and deflated on its own, ending on a full flush, so clean
+    tiles can be reused byte for byte from the template. Per certificate only the
+    tiles under the text are cropped, drawn, filtered and compressed.
+    """
+
+    def __init__(self, template, compiled, compress_level=6):
+        self.template = template
+        self.compiled = compiled
+        self.compress_level = compress_level
+        self.width, self.height = template.size
+        self.bpp = len(template.getbands())
+        # Reuse the ancillary chunks (IHDR, iCCP, pHYs, ...) Pillow would write
+        probe = io.BytesIO()
+        template.crop((0, 0, self.width, 1)).save(probe, format="PNG", compress_level=0)
+        self.header = self._chunks_before_idat(probe.getvalue(), self.height)
+        self.tile_count = (self.height + REGION_TILE_ROWS - 1) // REGION_TILE_ROWS
+        self._tiles = {}
+
+    @staticmethod
+    def _chunks_before_idat(png, height):
+        out = [png[:8]]
+        pos = 8
+        while pos < len(png):
+            length = struct.unpack(">I", png[pos:pos + 4])[0]
+            tag = png[pos + 4:pos + 8]
+            if tag == b"IDAT":
+                break
+            chunk = png[pos:pos + 12 + length]
+            if tag == b"IHDR":
+                # The probe was a single scanline; patch in the real height
+                data = chunk[8:8 + length]
+                data = data[:4] + struct.pack(">I", height) + data[8:]
+                chunk = _png_chunk(b"IHDR", data)
+            out.append(chunk)
+            pos += 12 + length
+        return b"".join(out)
+
+    def _encode_band(self, band):
+        """Filter and deflate a band image into (deflate bytes, adler32, raw length).
+
+        Each scanline gets the Sub or the Up filter, whichever leaves the smaller
+        bytes (libpng's heuristic); on smooth templates Up is what brings the output
+        down to Pillow's size. A band's first scanline is always Sub: Up would
+        depend on the band above, which may have been redrawn.
+        """
+        arr = np.asarray(band, dtype=np.uint8).reshape(band.size[1], -1)
+        bpp = self.bpp
+        raw = np.empty((arr.shape[0], arr.shape[1] + 1), dtype=np.uint8)
+        filtered = raw[:, 1:]
+        filtered[:, :bpp] = arr[:, :bpp]
+        np.subtract(arr[:, bpp:], arr[:, :-bpp], out=filtered[:, bpp:])
+        up = np.subtract(arr[1:], arr[:-1])
+        # min(v, -v) on bytes is the size of v read as signed
+        sub_cost = np.minimum(filtered[1:], -filtered[1:]).sum(axis=1, dtype=np.int32)
+        use_up = np.minimum(up, -up).sum(axis=1, dtype=np.int32) < sub_cost
+        raw[:, 0] = 1  # PNG filter type Sub
+        raw[1:, 0][use_up] = 2  # Up
+        filtered[1:][use_up] = up[use_up]
+        raw = raw.tobytes()
+        comp = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+        return comp.compress(raw) + comp.flush(zlib.Z_FULL_FLUSH), zlib.adler32(raw), len(raw)
+
+    def _tile_bounds(self, t):
+        return t * REGION_TILE_ROWS, min(self.height, (t + 1) * REGION_TILE_ROWS)
+
+    def _clean_tile(self, t):
+        tile = self._tiles.get(t)
+        if tile is None:
+            top, bottom = self._tile_bounds(t)
+            tile = self._tiles[t] = self._encode_band(self.template.crop((0, top, self.width, bottom)))
+        return tile
+
+    def encode(self, texts):
+        box = self.compiled.dirty_box(texts)
+        if box is None:
+            first = last = -1
+        else:
+            top = max(0, box[1] - REGION_MARGIN)
+            bottom = min(self.height, box[3] + REGION_MARGIN)
+            first = top // REGION_TILE_ROWS
+            last = (max(top, bottom - 1)) // REGION_TILE_ROWS
+            if bottom <= 0 or top >= self.height:
+                first = last = -1
+
+        parts = []
+        adler = 1
+        t = 0
+        while t < self.tile_count:
+            if first <= t <= last:
+                top, _ = self._tile_bounds(first)
+                _, bottom = self._tile_bounds(last)
+                band = self.template.crop((0, top, self.width, bottom))
+                self.compiled.draw(band, texts, offset=(0, top))
+                data, band_adler, length = self._encode_band(band)
+                t = last + 1
+            else:
+                data, band_adler, length = self._clean_tile(t)
+                t += 1
+            parts.append(data)
+            adler = _adler32_combine(adler, band_adler, length)
+
+        # zlib header, flushed deflate segments, empty final block, checksum
+        idat = b"\x78\x9c" + b"".join(parts) + b"\x03\x00" + struct.pack(">I", adler)
+        return self.header + _png_chunk(b"IDAT", idat) + _png_chunk(b"IEND", b"")
+
+
+def encode_certificate(image, output):
+    """Encode a rendered certificate according to the job's output settings."""
+    buf = io.BytesIO()
+    fmt = output["format"]
+    if fmt == "jpeg":
+        image.save(buf, format="JPEG", quality=output["quality"], optimize=True)
+    elif fmt == "webp":
+        image.save(buf, format="WEBP", quality=output["quality"])
+    else:
+        image.save(buf, format="PNG", compress_level=output["compress_level"])
+    return buf.getvalue()
+
+
+PARTIAL_SUFFIX = ".part"  # certificates being written; skipped by downloads
+
+
+# Encoded certificates are kept under RENDER_CACHE_FOLDER named by a hash of
+# everything that decides their bytes, so a re-run with a corrected spreadsheet
+# only renders the rows that changed. Entries are hard links to job outputs
+# where the filesystem allows; mtime marks last use for LRU eviction.
+def render_cache_prefix(image_path, layout):
+    """Hash of the template, font and layout shared by every row of a job; None if caching is off."""
+    if RENDER_CACHE_MAX_BYTES <= 0 or layout["output"]["format"] == "pdf":
+        return None
+    h = hashlib.sha256(b"render-v1")
+    h.update(_dataset_digest(image_path).encode())
+    font_path = resolve_font_path(layout.get("font_filename")) or FONT_PATH
+    h.update(_dataset_digest(font_path).encode() if os.path.isfile(font_path) else b"default")
+    settings = {k: layout[k] for k in ("column_positions", "font_sizes", "output")}
+    if layout.get("max_widths"):
+        settings["max_widths"] = layout["max_widths"]
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def render_cache_key(prefix, texts):
+    return hashlib.sha256((prefix + json.dumps(texts)).encode()).hexdigest()
+
+
+def _link_or_copy(src, dest):
+    tmp = dest + PARTIAL_SUFFIX
+    try:
+        os.link(src, tmp)
+    except FileExistsError:
+        os.remove(tmp)
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+def fetch_cached_render(key, dest):
+    """Place a cached certificate at dest; returns False on a miss."""
+    cache_path = os.path.join(RENDER_CACHE_FOLDER, key)
+    try:
+        os.utime(cache_path)
+        _link_or_copy(cache_path, dest)
+        return True
+    except OSError:
+        return False
+
+
+def store_cached_render(path, key):
+    try:
+        _link_or_copy(path, os.path.join(RENDER_CACHE_FOLDER, key))
+    except OSError:
+        pass
+
+
+def _evict_render_cache(now):
+    """Drop renders unused for RENDER_CACHE_TTL_SECONDS, then the least recently used beyond the size cap."""
+    entries = []
+    try:
+        with os.scandir(RENDER_CACHE_FOLDER) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError:
+        return
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if (now - mtime) <= RENDER_CACHE_TTL_SECONDS and total <= RENDER_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            continue
+
+
+def render_rows(template, compiled, rows, output_dir, encoder=None, cache_keys=None):
+    """Render a shard of rows into output_dir, adding each to the render cache if cache_keys is given.
+
+    Returns (certificates written, bytes written, Timings of the draw/encode/write/cache stages).
+    """
+    output = compiled.layout.get("output", DEFAULT_OUTPUT)
+    nbytes = 0
+    timings = Timings()
+    draw_seconds = encode_seconds = write_seconds = cache_seconds = 0.0
+    sprite_hits, sprite_misses = compiled.sprite_hits, compiled.sprite_misses
+    for i, (out_name, texts) in enumerate(rows):
+        start = time.perf_counter()
+        if encoder is not None:
+            # The region encoder draws as it encodes; its time all counts as encoding
+            drawn = start
+            data = encoder.encode(texts)
+        else:
+            base = render_certificate(template, compiled, texts)
+            drawn = time.perf_counter()
+            data = encode_certificate(base, output)
+        encoded = time.perf_counter()
+        # Write then rename so a download running alongside the job never sees a partial file
+        path = os.path.join(output_dir, out_name)
+        with open(path + PARTIAL_SUFFIX, "wb") as f:
+            f.write(data)
+        os.replace(path + PARTIAL_SUFFIX, path)
+        written = time.perf_counter()
+        if cache_keys:
+            store_cached_render(path, cache_keys[i])
+            cache_seconds += time.perf_counter() - written
+        draw_seconds += drawn - start
+        encode_seconds += encoded - drawn
+        write_seconds += written - encoded
+        timings.observe_row(written - start)
+        nbytes += len(data)
+    if encoder is None:
+        timings.add("draw", draw_seconds)
+    timings.add("encode", encode_seconds)
+    timings.add("write", write_seconds)
+    if cache_keys:
+        timings.add("cache", cache_seconds)
+    if compiled.repeated:
+        timings.count("text_sprite_hits", compiled.sprite_hits - sprite_hits)
+        timings.count("text_sprite_misses", compiled.sprite_misses - sprite_misses)
+    return len(rows), nbytes, timings
+
+
+def make_encoder(template, compiled):
+    """RegionEncoder for PNG output when RENDER_MODE is "region", else None (full-frame rendering)."""
+    output = compiled.layout.get("output", DEFAULT_OUTPUT)
+    if RENDER_MODE == "region" and output["format"] == "png":
+        return RegionEncoder(template, compiled, output["compress_level"])
+    return None
+
+
+def output_report(output, completed, nbytes, encode_seconds, wall_seconds):
+    """Size/speed summary of a job's encoded output so operators can compare formats."""
+    return {
+        "format": output["format"],
+        "bytes": nbytes,
+        "avg_bytes": nbytes // completed if completed else 0,
+        "encode_ms_per_cert": round(encode_seconds * 1000 / completed, 2) if completed else 0,
+        "certs_per_second": round(completed / wall_seconds, 2) if wall_seconds > 0 else 0,
+    }
+
+
+# PDF output: name of the single file written into a job's output dir
+PDF_FILENAME = "certificates.pdf"
+
+
+def _pdf_string(text):
+    """Encode text as a PDF literal string in WinAnsiEncoding, for the built-in Helvetica."""
+    try:
+        data = text.encode("cp1252")
+    except UnicodeEncodeError:
+        raise ValueError(f"{text!r} has characters the built-in PDF font cannot show; choose a TrueType font") from None
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class TrueTypeCmap:
+    """Unicode to glyph id lookup read straight from a TrueType file's cmap table (formats 4 and 12)."""
+
+    def __init__(self, data):
+        self.data = data
+        self._segments = []  # (start, end, lookup) sorted by start
+        (num_tables,) = struct.unpack_from(">H", data, 4)
+        tables = {}
+        for i in range(num_tables):
+            tag, _, offset, _ = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+            tables[tag] = offset
+        cmap = tables.get(b"cmap")
+        if cmap is None:
+            return
+        (count,) = struct.unpack_from(">H", data, cmap + 2)
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+            (fmt,) = struct.unpack_from(">H", data, cmap + offset)
+            subtables.setdefault((platform, encoding, fmt), cmap + offset)
+        # Full Unicode (format 12) beats the BMP-only format 4
+        for key in ((3, 10, 12), (0, 4, 12), (0, 6, 12), (3, 1, 4), (0, 3, 4), (0, 1, 4), (0, 0, 4)):
+            if key in subtables:
+                (self._read_format12 if key[2] == 12 else self._read_format4)(subtables[key])
+                break
+        self._segments.sort(key=lambda seg: seg[0])
+        self._starts = [seg[0] for seg in self._segments]
+
+    def _read_format4(self, pos):
+        data = self.data
+        (seg_count_x2,) = struct.unpack_from(">H", data, pos + 6)
+        n = seg_count_x2 // 2
+        ends = struct.unpack_from(">%dH" % n, data, pos + 14)
+        starts = struct.unpack_from(">%dH" % n, data, pos + 16 + seg_count_x2)
+        deltas = struct.unpack_from(">%dh" % n, data, pos + 16 + 2 * seg_count_x2)
+        range_pos = pos + 16 + 3 * seg_count_x2
+        range_offsets = struct.unpack_from(">%dH" % n, data, range_pos)
+        for i in range(n):
+            if starts[i] == 0xFFFF:
+                continue
+            if range_offsets[i] == 0:
+                lookup = (deltas[i], None)
+            else:
+                # Offset of the start code's entry in glyphIdArray, relative to the file
+                lookup = (deltas[i], range_pos + 2 * i + range_offsets[i])
+            self._segments.append((starts[i], ends[i], lookup))
+
+    def _read_format12(self, pos):
+        (groups,) = struct.unpack_from(">I", self.data, pos + 12)
+        for i in range(groups):
+            start, end, glyph = struct.unpack_from(">III", self.data, pos + 16 + 12 * i)
+            self._segments.append((start, end, (glyph - start, 12)))
+
+    def glyph(self, code):
+        """Glyph id for the code point, 0 (.notdef) if the font has none."""
+        i = bisect.bisect_right(self._starts, code) - 1
+        if i < 0:
+            return 0
+        start, end, (delta, table) = self._segments[i]
+        if code > end:
+            return 0
+        if table == 12:
+            return code + delta
+        if table is None:
+            return (code + delta) & 0xFFFF
+        (glyph,) = struct.unpack_from(">H", self.data, table + 2 * (code - start))
+        return (glyph + delta) & 0xFFFF if glyph else 0
+
+
+class PdfWriter:
+    """Minimal PDF writer that emits objects as soon as they are added.
+
+    The template is embedded once as an image XObject shared by every page and
+    the text is drawn as real text with the selected TrueType font embedded, so
+    a page costs a few hundred bytes and nothing is rasterised per row. The font
+    is a CID font shown by glyph id (Identity-H), so any script the TrueType file
+    covers comes out right. Its widths and ToUnicode map (which keeps the text
+    searchable and copyable) only list the glyphs used, and are written by close().
+    """
+
+    def __init__(self, out, template, compiled):
+        self.out = out
+        self.pos = 0
+        self.offsets = {}
+        self.next_num = 1
+        self.page_nums = []
+        self.compiled = compiled
+        self.width_px, self.height_px = template.size
+        dpi = template.info.get("dpi", (96, 96))[0] or 96
+        self.scale = 72.0 / float(dpi)
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.pages_num = self._reserve()
+        resources_num = self._reserve()
+        image_num = self._write_image(template)
+        self.cmap = None
+        self.glyphs = {}  # glyph id -> character, for the glyphs the pages use
+        font_num = self._write_font()
+        self._write_object(resources_num, b"<< /XObject << /Bg %d 0 R >> /Font << /F1 %d 0 R >> >>" % (image_num, font_num))
+        self.resources_num = resources_num
+
+    def _write(self, data):
+        self.out.write(data)
+        self.pos += len(data)
+
+    def _reserve(self):
+        num = self.next_num
+        self.next_num += 1
+        return num
+
+    def _write_object(self, num, body):
+        self.offsets[num] = self.pos
+        self._write(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    def _write_stream(self, num, entries, data):
+        self._write_object(num, b"<< " + entries + b" /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+
+    def _write_image(self, template):
+        num = self._reserve()
+        smask = b""
+        if template.mode == "RGBA":
+            alpha_num = self._reserve()
+            self._write_stream(
+                alpha_num,
+                b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode" % template.size,
+                zlib.compress(template.getchannel("A").tobytes()),
+            )
+            smask = b" /SMask %d 0 R" % alpha_num
+        rgb = template.convert("RGB") if template.mode != "RGB" else template
+        self._write_stream(
+            num,
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode" % template.size + smask,
+            zlib.compress(rgb.tobytes()),
+        )
+        return num
+
+    def _write_font(self):
+        num = self._reserve()
+        path = resolve_font_path(self.compiled.layout.get("font_filename"))
+        if not path:
+            # No TrueType file to embed; fall back to a standard PDF font
+            self._write_object(num, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+            return num
+        # Advances at a 1000px em are PDF glyph widths (thousandths of an em)
+        self.metrics_font = ImageFont.truetype(path, 1000)
+        ascent, descent = self.metrics_font.getmetrics()
+        with open(path, "rb") as f:
+            font_bytes = f.read()
+        self.cmap = TrueTypeCmap(font_bytes)
+        file_num = self._reserve()
+        self._write_stream(file_num, b"/Filter /FlateDecode /Length1 %d" % len(font_bytes), zlib.compress(font_bytes))
+        name = re.sub(r"[^A-Za-z0-9+-]", "", os.path.splitext(os.path.basename(path))[0]) or "Font"
+        descriptor_num = self._reserve()
+        self._write_object(descriptor_num, (
+            b"<< /Type /FontDescriptor /FontName /%s /Flags 32 /FontBBox [0 %d 1000 %d] /ItalicAngle 0"
+            b" /Ascent %d /Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>"
+        ) % (name.encode(), -descent, ascent, ascent, -descent, ascent, file_num))
+        self.font = (num, name.encode(), descriptor_num)
+        return num
+
+    def _show(self, text):
+        """text as a Tj operand: glyph ids in the embedded font, or WinAnsi for Helvetica."""
+        if self.cmap is None:
+            return _pdf_string(text)
+        ids = []
+        for ch in text:
+            glyph = self.cmap.glyph(ord(ch))
+            if not glyph and ch.isprintable():
+                raise ValueError(f"{text!r}: the selected font has no glyph for {ch!r}; choose a font that covers it")
+            self.glyphs.setdefault(glyph, ch)
+            ids.append(glyph)
+        return b"<" + b"".join(b"%04x" % glyph for glyph in ids) + b">"
+
+    def _write_type0_font(self):
+        num, name, descriptor_num = self.font
+        glyphs = sorted(self.glyphs.items())
+        widths = b" ".join(b"%d [%d]" % (glyph, round(self.metrics_font.getlength(ch))) for glyph, ch in glyphs)
+        cid_num = self._reserve()
+        self._write_object(cid_num, (
+            b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /%s"
+            b" /CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >>"
+            b" /FontDescriptor %d 0 R /CIDToGIDMap /Identity /W [%s] >>"
+        ) % (name, descriptor_num, widths))
+        mapping = [b"<%04x> <%s>" % (glyph, ch.encode("utf-16-be").hex().encode()) for glyph, ch in glyphs if glyph]
+        cmap = [
+            b"/CIDInit /ProcSet findresource begin 12 dict begin begincmap",
+            b"/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            b"/CMapName /Adobe-Identity-UCS def /CMapType 2 def",
+            b"1 begincodespacerange <0000> <ffff> endcodespacerange",
+        ]
+        for i in range(0, len(mapping), 100):
+            chunk = mapping[i:i + 100]
+            cmap += [b"%d beginbfchar" % len(chunk)] + chunk + [b"endbfchar"]
+        cmap.append(b"endcmap CMapName currentdict /CMap defineresource pop end end")
+        unicode_num = self._reserve()
+        self._write_stream(unicode_num, b"/Filter /FlateDecode", zlib.compress(b"\n".join(cmap)))
+        self._write_object(num, (
+            b"<< /Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H"
+            b" /DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>"
+        ) % (name, cid_num, unicode_num))
+
+    def add_page(self, texts):
+        scale = self.scale
+        page_w = self.width_px * scale
+        page_h = self.height_px * scale
+        ops = [b"q %.4f 0 0 %.4f 0 0 cm /Bg Do Q" % (page_w, page_h), b"BT 0 g"]
+        for i, text in enumerate(texts):
+            if text is None:
+                continue
+            # Same placement as the raster path; PDF wants the baseline, bottom-up
+            (x, y), _, font = self.compiled.placement(i, text)
+            ascent = font.getmetrics()[0] if hasattr(font, "getmetrics") else 0
+            size = getattr(font, "size", 10)
+            ops.append(b"/F1 %.2f Tf 1 0 0 1 %.2f %.2f Tm %s Tj" % (
+                size * scale, x * scale, (self.height_px - (y + ascent)) * scale, self._show(text)))
+        ops.append(b"ET")
+        content_num = self._reserve()
+        self._write_stream(content_num, b"/Filter /FlateDecode", zlib.compress(b"\n".join(ops)))
+        page_num = self._reserve()
+        self._write_object(page_num, b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources %d 0 R /Contents %d 0 R >>" % (
+            self.pages_num, page_w, page_h, self.resources_num, content_num))
+        self.page_nums.append(page_num)
+
+    def close(self):
+        if self.cmap is not None:
+            self._write_type0_font()
+        kids = b" ".join(b"%d 0 R" % n for n in self.page_nums)
+        self._write_object(self.pages_num, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_nums)))
+        catalog_num = self._reserve()
+        self._write_object(catalog_num, b"<< /Type /Catalog /Pages %d 0 R >>" % self.pages_num)
+        xref_pos = self.pos
+        entries = [b"xref\n0 %d\n" % self.next_num, b"0000000000 65535 f \n"]
+        for num in range(1, self.next_num):
+            entries.append(b"%010d 00000 n \n" % self.offsets.get(num, 0))
+        self._write(b"".join(entries))
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (self.next_num, catalog_num, xref_pos))
+
+
+def write_pdf(template, compiled, rows, out):
+    """Write rows as pages of one PDF to out, yielding (1, bytes, Timings) per page like render_rows."""
+    writer = PdfWriter(out, template, compiled)
+    for _, texts in rows:
+        start_pos = writer.pos
+        start = time.perf_counter()
+        writer.add_page(texts)
+        seconds = time.perf_counter() - start
+        timings = Timings()
+        timings.add("encode", seconds)
+        timings.observe_row(seconds)
+        yield 1, writer.pos - start_pos, timings
+    writer.close()
+
+
+# Template modes Pillow can wrap around a raw buffer without copying
+ZERO_COPY_MODES = ("L", "RGBA", "RGBX", "CMYK")
+
+
+def load_template(image_path, output_format="png"):
+    """Decode the template image with its mode normalised to RGB or RGBA.
+
+    Normalising once up front means copies made per certificate never need a
+    palette or greyscale conversion. JPEG output has no alpha, so the template
+    is flattened to RGB for it.
+    """
+    template = Image.open(image_path)
+    if output_format == "jpeg":
+        return template.convert("RGB")
+    if template.mode in ("RGB", "RGBA"):
+        template.load()
+        return template
+    has_alpha = "A" in template.getbands() or "transparency" in template.info
+    return template.convert("RGBA" if has_alpha else "RGB")
+
+
+class SharedTemplate:
+    """A decoded template published once in shared memory for the render workers."""
+
+    def __init__(self, template):
+        data = template.tobytes()
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        self.shm.buf[:len(data)] = data
+        self.source = {
+            "shm": self.shm.name,
+            "mode": template.mode,
+            "size": template.size,
+            "nbytes": len(data),
+        }
+
+    def close(self):
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+
+
+def _attach_template(source):
+    """Worker side of SharedTemplate; returns (template, shm handle to keep open)."""
+    if "shm" not in source:
+        return load_template(source["path"]), None
+    # Pool workers share the parent's resource tracker, so the segment is unlinked once by the parent
+    shm = shared_memory.SharedMemory(name=source["shm"])
+    mode, size = source["mode"], tuple(source["size"])
+    view = shm.buf[:source["nbytes"]]
+    if mode in ZERO_COPY_MODES:
+        return Image.frombuffer(mode, size, view, "raw", mode, 0, 1), shm
+    # Pillow keeps RGB padded to 4 bytes a pixel, so the packed buffer cannot be mapped;
+    # each worker unpacks it straight from shared memory into its own image
+    template = Image.frombytes(mode, size, view)
+    view.release()
+    shm.close()
+    return template, None
+
+
+class FinishedJobs:
+    """Announces finished job ids from the app process to every render worker.
+
+    A pool task reaches only one worker, so the ids go through a small shared
+    ring instead; each worker parks a thread on the condition and drops its
+    context for every id announced.
+    """
+
+    SLOTS = 64
+    SLOT_BYTES = 64
+
+    def __init__(self, ctx):
+        self.cond = ctx.Condition()
+        self.seq = ctx.RawValue("q", 0)
+        self.ids = ctx.RawArray("c", self.SLOTS * self.SLOT_BYTES)
+
+    def announce(self, job_id):
+        slot = job_id.encode()[:self.SLOT_BYTES].ljust(self.SLOT_BYTES, b"\0")
+        with self.cond:
+            start = self.seq.value % self.SLOTS * self.SLOT_BYTES
+            self.ids[start:start + self.SLOT_BYTES] = slot
+            self.seq.value += 1
+            self.cond.notify_all()
+
+    def listen(self, release):
+        """Worker side: call release(job_id) for each job announced from now on."""
+        with self.cond:
+            seen = self.seq.value
+        while True:
+            with self.cond:
+                while self.seq.value == seen:
+                    self.cond.wait()
+                # A worker that fell a whole ring behind has at worst kept a few contexts until LRU eviction
+                first, seen = max(seen, self.seq.value - self.SLOTS), self.seq.value
+                job_ids = []
+                for n in range(first, seen):
+                    start = n % self.SLOTS * self.SLOT_BYTES
+                    job_ids.append(self.ids[start:start + self.SLOT_BYTES].rstrip(b"\0").decode())
+            for job_id in job_ids:
+                release(job_id)
+
+
+# Process pool shared by all jobs; created on first use. Forking this process, whose
+# job, janitor and server threads may hold locks, could leave a worker deadlocked on
+# one, so workers come from a forkserver (spawned where there is none) and import the app
+_RENDER_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+if _RENDER_CONTEXT.get_start_method() == "forkserver":
+    # Not even __main__: under `python app.py` the server would start this module's threads
+    _RENDER_CONTEXT.set_forkserver_preload([])
+_RENDER_POOL = None
+_RENDER_POOL_LOCK = threading.Lock()
+_FINISHED_JOBS = None
+
+# Per-worker-process state of the jobs this worker last rendered (JOB_WORKERS may interleave)
+_WORKER_JOBS = OrderedDict()
+_WORKER_JOBS_LOCK = threading.Lock()
+
+
+def get_render_pool():
+    global _RENDER_POOL, _FINISHED_JOBS
+    with _RENDER_POOL_LOCK:
+        if _RENDER_POOL is None:
+            if _FINISHED_JOBS is None:
+                _FINISHED_JOBS = FinishedJobs(_RENDER_CONTEXT)
+            _RENDER_POOL = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=_RENDER_CONTEXT,
+                                               initializer=_init_render_worker, initargs=(_FINISHED_JOBS,))
+        return _RENDER_POOL
+
+
+def _init_render_worker(finished):
+    threading.Thread(target=finished.listen, args=(_drop_worker_job,), daemon=True).start()
+
+
+def _announce_finished_job(job_id):
+    """Let every render worker free the job's template and layout now rather than when new work arrives."""
+    if _FINISHED_JOBS is not None:
+        _FINISHED_JOBS.announce(job_id)
+
+
+def _reset_render_pool():
+    global _RENDER_POOL
+    with _RENDER_POOL_LOCK:
+        pool, _RENDER_POOL = _RENDER_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _release_worker_job(ctx):
+    shm = ctx.get("shm")
+    ctx.clear()
+    if shm is not None:
+        try:
+            shm.close()
+        except Exception:
+            # Still referenced by a live image; the mapping goes away with it
+            pass
+
+
+def _drop_worker_job(job_id):
+    with _WORKER_JOBS_LOCK:
+        ctx = _WORKER_JOBS.pop(job_id, None)
+    if ctx is not None:
+        _release_worker_job(ctx)
+
+
+def _render_shard(job_id, template_source, compiled, output_dir, rows, cache_keys=None):
+    """Process-pool entry point. Template and layout are set up once per worker per job."""
+    setup_seconds = 0.0
+    # The worker's font cache is its own; report its lookups with the shard, as sprites are
+    font_hits, font_misses = _FONT_CACHE_STATS["hits"], _FONT_CACHE_STATS["misses"]
+    with _WORKER_JOBS_LOCK:
+        ctx = _WORKER_JOBS.get(job_id)
+        if ctx is None:
+            start = time.perf_counter()
+            # Finished jobs are announced and dropped; this bounds jobs that failed mid-shard
+            while len(_WORKER_JOBS) >= JOB_WORKERS:
+                _release_worker_job(_WORKER_JOBS.popitem(last=False)[1])
+            # The job's font may have been uploaded or replaced since this worker loaded it;
+            # other fonts stay warm
+            stale = stale_font_path(compiled.layout.get("font_filename"))
+            if stale is not None:
+                invalidate_font_cache(os.path.basename(stale))
+            compiled._compile()
+            compiled.warm_sprites()
+            template, shm = _attach_template(template_source)
+            encoder = make_encoder(template, compiled)
+            ctx = _WORKER_JOBS[job_id] = dict(template=template, compiled=compiled, encoder=encoder, shm=shm)
+            setup_seconds = time.perf_counter() - start
+        else:
+            _WORKER_JOBS.move_to_end(job_id)
+    done, nbytes, timings = render_rows(ctx["template"], ctx["compiled"], rows, output_dir, ctx["encoder"], cache_keys)
+    if setup_seconds:
+        timings.add("worker_setup", setup_seconds)
+    timings.count("font_cache_hits", _FONT_CACHE_STATS["hits"] - font_hits)
+    timings.count("font_cache_misses", _FONT_CACHE_STATS["misses"] - font_misses)
+    return done, nbytes, timings
+
+
+# Archive entries with these extensions are already compressed; store them as-is
+ZIP_STORED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".pdf")
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+class _StreamBuffer:
+    """Unseekable file-like sink; written bytes are drained by a streaming generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _zip_compression_for(name):
+    if name.lower().endswith(ZIP_STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive chunk by chunk.
+
+    entries is an iterable of (arcname, source) where source is either bytes or a
+    path on disk; only one entry (and at most one file chunk) is held at a time.
+    """
+    buf = _StreamBuffer()
+    with zipfile.ZipFile(buf, mode="w") as zipf:
+        for arcname, source in entries:
+            if isinstance(source, (bytes, bytearray)):
+                zipf.writestr(arcname, source, compress_type=_zip_compression_for(arcname))
+                yield buf.drain()
+                continue
+            zinfo = zipfile.ZipInfo.from_file(source, arcname=arcname)
+            zinfo.compress_type = _zip_compression_for(arcname)
+            with open(source, "rb") as src, zipf.open(zinfo, "w") as dest:
+                while True:
+                    chunk = src.read(ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield buf.drain()
+            yield buf.drain()
+    yield buf.drain()
+
+
+def zip_response(chunks):
+    return Response(
+        chunks,
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=certificates.zip"},
+    )
+
+
 # Default text positions (normalized: x%, y%)
 positions = {
     "col1": (0.5, 0.5),  # center
@@ -169,14 +2072,11 @@ def index():
         image_filename = secure_filename(image.filename)
         image_path = os.path.join(app.config["UPLOAD_FOLDER"], image_filename)
         image.save(image_path)
+        warm_preview(image_path)
 
-        # Read dataframe (respect headers flag for column discovery)
-        if filename.endswith(".csv"):
-            df = pd.read_csv(file_path, header=0 if headers_present else None)
-        else:
-            df = pd.read_excel(file_path, header=0 if headers_present else None)
-
-        columns = [str(c) for c in df.columns.tolist()]
+        # Read dataframe (respect headers flag for column discovery); only the
+        # first chunk of a large upload is read here
+        columns = [str(c) for c in open_dataset(filename, headers_present)[0].tolist()]
         return render_template(
             "options.html",
             columns=columns,
@@ -191,8 +2091,6 @@ def index():
 
 @app.route("/generate", methods=["POST"])
 def generate():
-    column_positions = {}
-    font_sizes = {}
     selected_font_filename = None
     file_column = request.form.get("file_column")  # optional, by name
     image_filename = request.form.get("image")
@@ -202,94 +2100,74 @@ def generate():
     # Handle font selection/upload (sync)
     font_choice = request.form.get("font_choice")
     if font_choice == "other":
-        file = request.files.get("font_file")
-        if file and file.filename.lower().endswith('.ttf'):
-            fname = secure_filename(file.filename)
-            for d in FONTS_DIRS:
-                try:
-                    os.makedirs(d, exist_ok=True)
-                    file.save(os.path.join(d, fname))
-                    selected_font_filename = fname
-                    break
-                except Exception:
-                    continue
+        selected_font_filename = save_uploaded_font(request.files.get("font_file"))
     elif font_choice:
         selected_font_filename = font_choice
 
-    img = Image.open(os.path.join(UPLOAD_FOLDER, image_filename))
-    img_w, img_h = img.size
-
     # Collect column settings (normalized positions 0-1)
-    for key in request.form:
-        if key.startswith("pos_") and key.endswith("_x"):
-            col = key[len("pos_"):-2]
-            # robust parsing with defaults
-            try:
-                x = float(request.form.get(f"pos_{col}_x", 0.5))
-            except Exception:
-                x = 0.5
-            try:
-                y = float(request.form.get(f"pos_{col}_y", 0.5))
-            except Exception:
-                y = 0.5
+    column_positions, font_sizes = parse_column_settings(request.form)
+    max_widths = parse_max_widths(request.form)
+    output = parse_output_settings(request.form)
+
+    img = load_template(os.path.join(UPLOAD_FOLDER, image_filename), output["format"])
+
+    # Read dataframe (assume headers present, columns by name); large files in chunks
+    columns, chunks = open_dataset(data_filename, headers_present)
+
+    layout = {
+        "column_positions": column_positions,
+        "font_sizes": font_sizes,
+        "max_widths": max_widths,
+        "font_filename": selected_font_filename,
+        "output": output,
+    }
+    compiled = CompiledLayout(layout, img, columns)
+    chunks = _find_repeated(compiled, chunks)
+    rows = (row for chunk in chunks for row in collect_rows(chunk, compiled, file_column))
+
+    if output["format"] == "pdf":
+        def pdf_chunks():
+            sink = _StreamBuffer()
             try:
-                size = int(float(request.form.get(f"size_{col}", 40)))
-            except Exception:
-                size = 40
-            # clamp and store
-            x = 0 if x < 0 else (1 if x > 1 else x)
-            y = 0 if y < 0 else (1 if y > 1 else y)
-            size = max(1, size)
-            column_positions[col] = (x, y)
-            font_sizes[col] = size
+                for _ in write_pdf(img, compiled, rows, sink):
+                    yield sink.drain()
+                yield sink.drain()
+            finally:
+                _remove_uploads(image_filename, data_filename)
+
+        return Response(pdf_chunks(), mimetype="application/pdf",
+                        headers={"Content-Disposition": f"attachment; filename={PDF_FILENAME}"})
+
+    encoder = make_encoder(img, compiled)
+
+    def entries():
+        # Certificates are rendered lazily as the archive is streamed (no disk writes)
+        for out_name, texts in rows:
+            if encoder is not None:
+                yield out_name, encoder.encode(texts)
+                continue
+            base = render_certificate(img, compiled, texts)
+            yield out_name, encode_certificate(base, output)
 
-    # Read dataframe (assume headers present, columns by name)
-    data_path = os.path.join(UPLOAD_FOLDER, data_filename)
-    if data_filename.endswith(".csv"):
-        df = pd.read_csv(data_path, header=0 if headers_present else None)
-    else:
-        df = pd.read_excel(data_path, header=0 if headers_present else None)
+    def chunks():
+        try:
+            yield from stream_zip(entries())
+        finally:
+            _remove_uploads(image_filename, data_filename)
 
-    # Map displayed column names (stringified) back to actual df keys
-    col_key_map = {str(c): c for c in df.columns}
+    return zip_response(chunks())
 
-    # Prepare zip fully in-memory (no disk writes)
-    zip_bytes = io.BytesIO()
-    with zipfile.ZipFile(zip_bytes, mode='w', compression=zipfile.ZIP_DEFLATED) as zipf:
-        for idx, row in df.iterrows():
-            base = img.copy()
-            draw = ImageDraw.Draw(base)
-            for col, (x_norm, y_norm) in column_positions.items():
-                if col in col_key_map:
-                    value = row[col_key_map[col]]
-                else:
-                    continue
-                if pd.isna(value):
-                    continue
-                text = str(value)
-                font = load_font(font_sizes.get(col, 40), selected_font_filename)
-                bbox = draw.textbbox((0, 0), text, font=font)
-                text_w = bbox[2] - bbox[0]
-                text_h = bbox[3] - bbox[1]
-                x = int(x_norm * img_w - text_w / 2)
-                y = int(y_norm * img_h - (text_h / 2 + bbox[1]))
-                draw.text((x, y), text, fill=(0, 0, 0, 255), font=font)
-
-            if file_column and file_column in col_key_map:
-                candidate = normalize_filename_value(row[col_key_map[file_column]])
-                if candidate:
-                    out_name = f"{candidate}.png"
-                else:
-                    out_name = f"generated_{idx}.png"
-            else:
-                out_name = f"generated_{idx}.png"
 
-            img_buf = io.BytesIO()
-            base.save(img_buf, format='PNG')
-            img_buf.seek(0)
-            zipf.writestr(out_name, img_buf.read())
-    zip_bytes.seek(0)
+def _find_repeated(compiled, chunks):
+    """Choose compiled's sprite-drawn columns from the first chunk; returns the chunks, still all there."""
+    first = next(chunks, None)
+    if first is None:
+        return iter(())
+    compiled.find_repeated(first)
+    return itertools.chain([first], chunks)
 
+
+def _remove_uploads(image_filename, data_filename):
     # best-effort: delete uploaded files now that generation is complete
     try:
         if image_filename:
@@ -303,149 +2181,496 @@ def generate():
     except Exception:
         pass
 
-    return send_file(zip_bytes, mimetype='application/zip', as_attachment=True, download_name='certificates.zip')
-def run_generation_job(job_id, image_filename, data_filename, headers_present, column_positions, font_sizes, file_column):
+
+def _bounded_results(pool, fn, arg_tuples, futures, window):
+    """Submit fn(*args) for each args as earlier calls finish, keeping at most window in flight.
+
+    Yields results in completion order; futures holds the calls still pending so a
+    failing job can cancel them.
+    """
+    for args in arg_tuples:
+        futures.add(pool.submit(fn, *args))
+        if len(futures) < window:
+            continue
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for f in done:
+            futures.discard(f)
+            yield f.result()
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for f in done:
+            futures.discard(f)
+            yield f.result()
+
+
+def _save_profile(job_id, sampler):
+    """Stop a job's sampler and store what it collected; returns the profile's URL (None if not profiled)."""
+    if sampler is None:
+        return None
+    sampler.stop()
     try:
-        img = Image.open(os.path.join(UPLOAD_FOLDER, image_filename))
-        img_w, img_h = img.size
+        sampler.write(os.path.join(PROFILE_FOLDER, f"{job_id}.txt"))
+    except OSError:
+        return None
+    return f"/profile/{job_id}"
 
-        data_path = os.path.join(UPLOAD_FOLDER, data_filename)
-        if data_filename.endswith(".csv"):
-            df = pd.read_csv(data_path, header=0 if headers_present else None)
-        else:
-            df = pd.read_excel(data_path, header=0 if headers_present else None)
 
-        col_key_map = {str(c): c for c in df.columns}
+def run_generation_job(job_id, image_filename, data_filename, headers_present, column_positions, font_sizes, file_column,
+                       output=None, max_widths=None):
+    futures = set()
+    pooled = False
+    shared = None
+    pdf_file = None
+    sampler = None
+    timings = Timings()
+    try:
+        image_path = os.path.join(UPLOAD_FOLDER, image_filename)
 
-        with JOBS_LOCK:
-            job = JOBS.get(job_id)
+        job = JOBS.get(job_id)
         if not job:
             return
+        now = time.time()
+        JOBS.update(job_id, status="running", started=now, updated=now)
+        timings.add("queue", now - job.get("created", now))
         output_dir = job["output_dir"]
         os.makedirs(output_dir, exist_ok=True)
+        if job.get("profile"):
+            sampler = StackSampler(threading.get_ident()).start()
+
+        # Settings are fixed for the lifetime of the job; compile them once
+        layout = {
+            "column_positions": column_positions,
+            "font_sizes": font_sizes,
+            "max_widths": max_widths or {},
+            "font_filename": job.get("font_filename"),
+            "output": output or DEFAULT_OUTPUT,
+        }
+        start = time.perf_counter()
+        template = load_template(image_path, layout["output"]["format"])
+        timings.add("template", time.perf_counter() - start)
+        # Large uploads arrive chunk by chunk; rows and shards are produced lazily
+        # so rendering starts on the first chunk
+        start = time.perf_counter()
+        columns, chunks = open_dataset(data_filename, headers_present)
+        total = job.get("total") or count_dataset_rows(data_filename, headers_present)
+        timings.add("parse", time.perf_counter() - start)
+        start = time.perf_counter()
+        compiled = CompiledLayout(layout, template, columns)
+        chunks = _find_repeated(compiled, chunks)
+        timings.add("layout", time.perf_counter() - start)
+        row_batches = _timed((collect_rows(chunk, compiled, file_column) for chunk in chunks), timings, "parse")
+        rows = (row for batch in row_batches for row in batch)
+        started = time.time()
+
+        # Rows rendered before with the same template, font and layout are linked
+        # from the render cache; only the rest go to the renderer
+        cached = 0
+        prefix = render_cache_prefix(image_path, layout)
+
+        def pending_rows():
+            nonlocal cached
+            for row in rows:
+                key = None
+                if prefix is not None:
+                    start = time.perf_counter()
+                    key = render_cache_key(prefix, row[1])
+                    hit = fetch_cached_render(key, os.path.join(output_dir, row[0]))
+                    timings.add("cache", time.perf_counter() - start)
+                    if hit:
+                        cached += 1
+                        continue
+                yield row, key
+
+        def shards():
+            pending = pending_rows()
+            while True:
+                shard = list(itertools.islice(pending, RENDER_SHARD_SIZE))
+                if not shard:
+                    return
+                keys = [key for _, key in shard] if prefix is not None else None
+                yield [row for row, _ in shard], keys
+
+        JOBS.update(job_id, total=total, completed=0, cached=0, updated=time.time())
+        nbytes = 0
+
+        if layout["output"]["format"] == "pdf":
+            # A single vector PDF: pages carry no pixels, so they are written on this thread
+            pdf_file = open(os.path.join(output_dir, PDF_FILENAME), "wb")
+            results = write_pdf(template, compiled, (row for row, _ in pending_rows()), pdf_file)
+        else:
+            shard_iter = shards()
+            head = list(itertools.islice(shard_iter, 2))
+            shard_iter = itertools.chain(head, shard_iter)
+            if not head:
+                results = ()
+            elif RENDER_WORKERS > 1 and len(head) > 1 and sampler is None:
+                # Workers attach to the decoded template instead of decoding it again
+                try:
+                    shared = SharedTemplate(template)
+                    source = shared.source
+                except Exception:
+                    source = {"path": image_path}
+                del template
+                pooled = True
+                # A bounded number of shards in flight keeps memory flat on huge sheets
+                results = _bounded_results(
+                    get_render_pool(), _render_shard,
+                    ((job_id, source, compiled, output_dir, shard, keys) for shard, keys in shard_iter),
+                    futures, 2 * RENDER_WORKERS,
+                )
+            else:
+                # Profiled jobs also render here, so the sampler sees the rendering
+                compiled.warm_sprites()
+                encoder = make_encoder(template, compiled)
+                results = (render_rows(template, compiled, shard, output_dir, encoder, keys)
+                           for shard, keys in shard_iter)
+
+        # Only this thread writes the job's progress, so it is counted here and
+        # published in batches rather than one store write per page or shard
+        rendered = 0
+        published = started
+        for done, shard_bytes, shard_timings in results:
+            rendered += done
+            nbytes += shard_bytes
+            timings.merge(shard_timings)
+            now = time.time()
+            if now - published >= JOB_PROGRESS_INTERVAL:
+                published = now
+                JOBS.update(job_id, completed=cached + rendered, cached=cached, updated=now,
+                            timings=timings.as_dict(),
+                            report=output_report(layout["output"], rendered, nbytes,
+                                                 timings.stages.get("encode", 0.0), now - started))
+
+        if pdf_file is not None:
+            # Flush the trailer before anyone is told the PDF is complete
+            pdf_file.close()
+        METRICS.inc("certgen_rows_total", rendered, source="rendered")
+        METRICS.inc("certgen_rows_total", cached, source="cached")
+        if prefix is not None:
+            METRICS.inc("certgen_cache_requests_total", cached, cache="render", result="hit")
+            METRICS.inc("certgen_cache_requests_total", rendered, cache="render", result="miss")
+        METRICS.inc("certgen_jobs_total", status="done")
+        profile_url, sampler = _save_profile(job_id, sampler), None
+        # Streamed uploads start from an estimated total; the real count is known now
+        JOBS.update(job_id, status="done", completed=cached + rendered, cached=cached, total=cached + rendered,
+                    updated=time.time(), timings=timings.as_dict(), profile_url=profile_url,
+                    report=output_report(layout["output"], rendered, nbytes,
+                                         timings.stages.get("encode", 0.0), time.time() - started))
+    except Exception as e:
+        for f in futures:
+            f.cancel()
+        if isinstance(e, BrokenProcessPool):
+            _reset_render_pool()
+        METRICS.inc("certgen_jobs_total", status="error")
+        profile_url, sampler = _save_profile(job_id, sampler), None
+        JOBS.update(job_id, status="error", error=str(e), updated=time.time(), profile_url=profile_url)
+    finally:
+        if pooled:
+            _announce_finished_job(job_id)
+        if shared is not None:
+            shared.close()
+        if pdf_file is not None:
+            pdf_file.close()
+        METRICS.add_timings(timings)
+
+
+class JobScheduler:
+    """Runs generation jobs on a fixed pool of threads from a persistent, fair queue.
+
+    The queue lives in SQLite next to the job store. With a shared job store every
+    process on the file draws from one queue and each job is claimed exactly once.
+    Otherwise a process only sees the jobs it queued itself, since nobody else could
+    report their progress, plus those of processes that stopped heartbeating, so
+    a restart picks up where the last run left off. At most JOB_QUEUE_LIMIT jobs
+    wait at once. A free worker claims the oldest job of the
+    owner with the fewest running jobs, so one user's burst cannot starve everybody
+    else. Running jobs hold a lease renewed by a heartbeat; if their process dies
+    the lease expires and the job is queued again.
+    """
+
+    def __init__(self, db_path, workers, limit, shared=True):
+        self.db_path = db_path
+        self.workers = workers
+        self.limit = limit
+        self.shared = shared
+        self.instance = uuid.uuid4().hex
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._running = set()  # job ids running in this process
+        self._rate = None  # smoothed rows/second of a single job
+        self._threads = []
+        with self._db() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS queue (job_id TEXT PRIMARY KEY, enqueued REAL, owner TEXT,"
+                " total INTEGER, state TEXT, heartbeat REAL, payload TEXT, instance TEXT)"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS instances (id TEXT PRIMARY KEY, heartbeat REAL)")
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # uri=True lets a headless process keep its queue in a shared in-memory database
+            db = self._local.db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, uri=True)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _db(self):
+        return _SqliteTransaction(self._conn())
+
+    def _scope(self, now):
+        """SQL condition (and its parameters) for the queue rows this process may see and claim."""
+        if self.shared:
+            return "1", ()
+        return ("(instance = ? OR instance NOT IN (SELECT id FROM instances WHERE heartbeat >= ?))",
+                (self.instance, now - JOB_LEASE_SECONDS))
+
+    def _beat(self):
+        now = time.time()
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO instances VALUES (?, ?)", (self.instance, now))
+            db.execute("DELETE FROM instances WHERE heartbeat < ?", (now - JOB_STALE_SECONDS,))
+
+    def start(self):
+        self._beat()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+    def submit(self, job_id, owner, args, job):
+        """Queue a job; returns False when the queue is full."""
+        payload = json.dumps({"args": list(args), "job": job})
+        now = time.time()
+        scope, params = self._scope(now)
+        with self._db() as db:
+            (queued,) = db.execute(f"SELECT COUNT(*) FROM queue WHERE state = 'queued' AND {scope}", params).fetchone()
+            if queued >= self.limit:
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO queue (job_id, enqueued, owner, total, state, heartbeat, payload, instance)"
+                " VALUES (?, ?, ?, ?, 'queued', NULL, ?, ?)",
+                (job_id, now, owner, job.get("total", 0), payload, self.instance),
+            )
+        with self._cond:
+            self._cond.notify()
+        return True
+
+    def _claim(self):
+        """Atomically move the next fair job to running; returns (job_id, total, payload) or None."""
+        now = time.time()
+        scope, params = self._scope(now)
+        with self._db() as db:
+            db.execute(
+                "UPDATE queue SET state = 'queued' WHERE state = 'running' AND heartbeat < ?",
+                (now - JOB_LEASE_SECONDS,),
+            )
+            claim = next(self._fair_order(db, scope, params, "job_id, owner, total, payload"), None)
+            if claim is None:
+                return None
+            job_id, _, total, payload = claim
+            db.execute("UPDATE queue SET state = 'running', heartbeat = ?, instance = ? WHERE job_id = ?",
+                       (now, self.instance, job_id))
+        return job_id, total, payload
+
+    def _fair_order(self, db, scope, params, columns="job_id, owner, total"):
+        """Yield the queued rows (owner second) in the order workers would claim them if nothing finished.
+
+        Each claim goes to the owner with the fewest running jobs, oldest job first on ties.
+        """
+        by_owner = {}
+        for index, row in enumerate(db.execute(
+            f"SELECT {columns} FROM queue WHERE state = 'queued' AND {scope} ORDER BY enqueued", params
+        )):
+            by_owner.setdefault(row[1], []).append((index, row))
+        running_by_owner = dict(db.execute(
+            f"SELECT owner, COUNT(*) FROM queue WHERE state = 'running' AND {scope} GROUP BY owner", params
+        ).fetchall())
+        heap = [(running_by_owner.get(owner, 0), rows[0][0], owner) for owner, rows in by_owner.items()]
+        heapq.heapify(heap)
+        while heap:
+            running, _, owner = heapq.heappop(heap)
+            rows = by_owner[owner]
+            yield rows.pop(0)[1]
+            if rows:
+                heapq.heappush(heap, (running + 1, rows[0][0], owner))
+
+    def _forget(self, job_id):
+        try:
+            with self._db() as db:
+                db.execute("DELETE FROM queue WHERE job_id = ?", (job_id,))
+        except Exception:
+            pass
 
-        total = len(df)
-        with JOBS_LOCK:
-            job["total"] = total
-            job["completed"] = 0
-            job["updated"] = time.time()
-        for idx, row in df.iterrows():
-            base = img.copy()
-            draw = ImageDraw.Draw(base)
-            for col, (x_norm, y_norm) in column_positions.items():
-                if col in col_key_map:
-                    value = row[col_key_map[col]]
-                else:
-                    continue
-                if pd.isna(value):
+    def _fail(self, job_id, error):
+        """Error a job whose queue entry could not be started; the entry is dropped, so it would stay queued."""
+        try:
+            job = JOBS.get(job_id)
+            if job is not None and job.get("status") == "queued":
+                METRICS.inc("certgen_jobs_total", status="error")
+                JOBS.update(job_id, status="error", error=f"Could not start the job: {error}", updated=time.time())
+        except Exception:
+            pass
+
+    def _prepare(self, job_id, payload):
+        """Decode a claimed job, re-registering it if it was queued by an earlier process."""
+        data = json.loads(payload)
+        args, job = data["args"], data["job"]
+        # JSON turns the (x, y) tuples into lists
+        args[4] = {col: tuple(pos) for col, pos in args[4].items()}
+        if JOBS.get(job_id) is None:
+            uploads = job.get("uploads", {})
+            if not all(os.path.exists(os.path.join(UPLOAD_FOLDER, uploads.get(k) or "")) for k in ("image", "data")):
+                return None
+            job.update(status="queued", completed=0, error=None, updated=time.time())
+            JOBS.create(job_id, job)
+        return args
+
+    def _worker_loop(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception:
+                claimed = None
+            if claimed is None:
+                # Local submissions wake us immediately; other processes' jobs are polled
+                with self._cond:
+                    self._cond.wait(timeout=1.0)
+                continue
+            job_id, total, payload = claimed
+            with self._cond:
+                self._running.add(job_id)
+            started = time.time()
+            try:
+                args = self._prepare(job_id, payload)
+                if args is not None:
+                    run_generation_job(*args)
+            except Exception as e:
+                self._fail(job_id, e)
+            finally:
+                elapsed = time.time() - started
+                with self._cond:
+                    self._running.discard(job_id)
+                    if total and elapsed > 0:
+                        rate = total / elapsed
+                        self._rate = rate if self._rate is None else 0.7 * self._rate + 0.3 * rate
+                self._forget(job_id)
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(JOB_LEASE_SECONDS / 3)
+            with self._cond:
+                running = list(self._running)
+            try:
+                self._beat()
+                if not running:
                     continue
-                text = str(value)
-                with JOBS_LOCK:
-                    job = JOBS.get(job_id)
-                    job_font = job.get("font_filename") if job else None
-                font = load_font(font_sizes.get(col, 40), job_font)
-                bbox = draw.textbbox((0, 0), text, font=font)
-                text_w = bbox[2] - bbox[0]
-                text_h = bbox[3] - bbox[1]
-                x = int(x_norm * img_w - text_w / 2)
-                y = int(y_norm * img_h - (text_h / 2 + bbox[1]))
-                draw.text((x, y), text, fill=(0, 0, 0, 255), font=font)
-
-            if file_column and file_column in col_key_map:
-                candidate = normalize_filename_value(row[col_key_map[file_column]])
-                if candidate:
-                    out_name = f"{candidate}.png"
-                else:
-                    out_name = f"generated_{idx}.png"
-            else:
-                out_name = f"generated_{idx}.png"
+                with self._db() as db:
+                    db.executemany(
+                        "UPDATE queue SET heartbeat = ? WHERE job_id = ?",
+                        [(time.time(), job_id) for job_id in running],
+                    )
+            except Exception:
+                pass
 
-            out_path = os.path.join(output_dir, out_name)
-            base.save(out_path)
+    def position(self, job_id):
+        """1-based place of a queued job, or None once it has started."""
+        scope, params = self._scope(time.time())
+        for place, (queued_id, _, _) in enumerate(self._fair_order(self._conn(), scope, params), 1):
+            if queued_id == job_id:
+                return place
+        return None
 
-            with JOBS_LOCK:
-                job["completed"] += 1
-                job["updated"] = time.time()
+    def eta(self, job_id, job):
+        """Rough seconds until job_id finishes, from observed throughput; None if unknown."""
+        now = time.time()
+        completed = job.get("completed", 0)
+        total = job.get("total", 0)
+        if job.get("status") in ("done", "error"):
+            return 0
+        if job.get("status") == "running":
+            elapsed = now - job.get("started", now)
+            if completed and elapsed > 0:
+                return round((total - completed) * elapsed / completed, 1)
+            return None
+        rate = self._rate
+        if not rate:
+            return None
+        db = self._conn()
+        scope, params = self._scope(now)
+        ahead = 0
+        for queued_id, _, queued_total in self._fair_order(db, scope, params):
+            if queued_id == job_id:
+                break
+            ahead += queued_total or 0
+        else:
+            return None
+        running = [r[0] for r in db.execute(f"SELECT job_id FROM queue WHERE state = 'running' AND {scope}",
+                                            params).fetchall()]
+        backlog = ahead + total
+        for rid in running:
+            rjob = JOBS.get(rid) or {}
+            backlog += max(0, rjob.get("total", 0) - rjob.get("completed", 0))
+        return round(backlog / (rate * self.workers), 1)
 
-        with JOBS_LOCK:
-            job["status"] = "done"
-            job["updated"] = time.time()
-    except Exception as e:
-        with JOBS_LOCK:
-            job = JOBS.get(job_id)
-            if job is not None:
-                job["status"] = "error"
-                job["error"] = str(e)
-                job["updated"] = time.time()
+    def depth(self):
+        scope, params = self._scope(time.time())
+        return self._conn().execute(f"SELECT COUNT(*) FROM queue WHERE state = 'queued' AND {scope}",
+                                    params).fetchone()[0]
+
+    def queued_jobs(self):
+        """Job entries of everything in the queue, including jobs queued by earlier processes."""
+        rows = self._conn().execute("SELECT payload FROM queue").fetchall()
+        return [json.loads(payload)["job"] for (payload,) in rows]
+
+
+JOB_SCHEDULER = JobScheduler(JOB_QUEUE_DB, JOB_WORKERS, JOB_QUEUE_LIMIT, shared=JOB_STORE == "sqlite")
 
 
 @app.route("/start_generate", methods=["POST"])
 def start_generate():
-    column_positions = {}
-    font_sizes = {}
     file_column = request.form.get("file_column")
     image_filename = request.form.get("image")
     data_filename = request.form.get("data_file")
     headers_present = request.form.get("headers_present") in ("true", "True", "1", "on", "yes")
 
     # Collect column settings (normalized positions 0-1)
-    for key in request.form:
-        if key.startswith("pos_") and key.endswith("_x"):
-            col = key[len("pos_"):-2]
-            try:
-                x = float(request.form.get(f"pos_{col}_x", 0.5))
-            except Exception:
-                x = 0.5
-            try:
-                y = float(request.form.get(f"pos_{col}_y", 0.5))
-            except Exception:
-                y = 0.5
-            try:
-                size = int(float(request.form.get(f"size_{col}", 40)))
-            except Exception:
-                size = 40
-            x = 0 if x < 0 else (1 if x > 1 else x)
-            y = 0 if y < 0 else (1 if y > 1 else y)
-            size = max(1, size)
-            column_positions[col] = (x, y)
-            font_sizes[col] = size
+    column_positions, font_sizes = parse_column_settings(request.form)
+    max_widths = parse_max_widths(request.form)
+    output = parse_output_settings(request.form)
 
     # Handle font selection/upload (async)
     selected_font_filename = None
     font_choice = request.form.get("font_choice")
     if font_choice == "other":
-        file = request.files.get("font_file")
-        if file and file.filename.lower().endswith('.ttf'):
-            fname = secure_filename(file.filename)
-            for d in FONTS_DIRS:
-                try:
-                    os.makedirs(d, exist_ok=True)
-                    file.save(os.path.join(d, fname))
-                    selected_font_filename = fname
-                    break
-                except Exception:
-                    continue
+        selected_font_filename = save_uploaded_font(request.files.get("font_file"))
     elif font_choice:
         selected_font_filename = font_choice
 
-    # Determine total rows for progress
+    profile = JOB_PROFILING and request.form.get("profile") in ("true", "True", "1", "on", "yes")
+    queued = enqueue_job(request.remote_addr, image_filename, data_filename, headers_present, column_positions,
+                         font_sizes, file_column, output, selected_font_filename, profile, max_widths)
+    if queued is None:
+        return jsonify({"error": "Too many certificate jobs are waiting; please try again shortly."}), 503
+    job_id, total_rows = queued
+    return jsonify({"job_id": job_id, "total": total_rows, "queue_position": JOB_SCHEDULER.position(job_id)})
+
+
+def enqueue_job(owner, image_filename, data_filename, headers_present, column_positions, font_sizes,
+                file_column, output, font_filename=None, profile=False, max_widths=None):
+    """Register a generation job for uploaded files and queue it; returns (job_id, total) or None if the queue is full."""
+    # Determine total rows for progress (large uploads are counted, not parsed)
     total_rows = 0
     try:
-        data_path = os.path.join(UPLOAD_FOLDER, data_filename)
-        if data_filename.endswith(".csv"):
-            df_tmp = pd.read_csv(data_path, header=0 if headers_present else None)
-        else:
-            df_tmp = pd.read_excel(data_path, header=0 if headers_present else None)
-        total_rows = len(df_tmp)
+        total_rows = count_dataset_rows(data_filename, headers_present)
     except Exception:
         total_rows = 0
 
     # Create unique job and output dir
     job_id = uuid.uuid4().hex
     job_output_dir = os.path.join(OUTPUT_FOLDER, job_id)
-    with JOBS_LOCK:
-        JOBS[job_id] = {
-        "status": "running",
+    job = {
+        "status": "queued",
         "completed": 0,
         "total": total_rows,
         "output_dir": job_output_dir,
@@ -453,50 +2678,266 @@ def start_generate():
         "created": time.time(),
         "updated": time.time(),
         "uploads": {"image": image_filename, "data": data_filename},
-        "font_filename": selected_font_filename,
+        "font_filename": font_filename,
+        "output": output,
+        "report": None,
+        # Sampling profile of this one job (JOB_PROFILING must allow it); renders on a single thread
+        "profile": profile,
     }
+    JOBS.create(job_id, job)
+
+    args = (job_id, image_filename, data_filename, headers_present, column_positions, font_sizes, file_column, output,
+            max_widths or {})
+    if not JOB_SCHEDULER.submit(job_id, owner, args, job):
+        JOBS.delete(job_id)
+        return None
+    return job_id, total_rows
+
+
+@app.route("/layout", methods=["POST"])
+def save_layout():
+    """Download the options form as a saved layout (JSON) for /api/jobs and cli.py."""
+    column_positions, font_sizes = parse_column_settings(request.form)
+    max_widths = parse_max_widths(request.form)
+    selected_font_filename = None
+    font_choice = request.form.get("font_choice")
+    if font_choice == "other":
+        selected_font_filename = save_uploaded_font(request.files.get("font_file"))
+    elif font_choice:
+        selected_font_filename = font_choice
+    layout = layout_to_dict(
+        column_positions, font_sizes, selected_font_filename, request.form.get("file_column"),
+        request.form.get("headers_present") in ("true", "True", "1", "on", "yes"), parse_output_settings(request.form),
+        max_widths,
+    )
+    return Response(json.dumps(layout, indent=2), mimetype="application/json",
+                    headers={"Content-Disposition": "attachment; filename=layout.json"})
+
+
+@app.route("/api/jobs", methods=["POST"])
+def api_create_job():
+    """Queue a job without the options page.
+
+    Multipart fields: layout (a saved layout, as a file or a JSON string),
+    template (image file), data (.csv/.xlsx file) and optionally font_file (.ttf).
+    Answers 202 with the job id and the URLs to follow and download it.
+    """
+    layout_file = request.files.get("layout")
+    try:
+        raw = layout_file.read() if layout_file else request.form.get("layout", "")
+        settings = parse_layout(json.loads(raw))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid layout: {e}"}), 400
+    template = request.files.get("template")
+    data = request.files.get("data")
+    if not template or not data:
+        return jsonify({"error": "Both a template and a data file are required."}), 400
+    if os.path.splitext(data.filename or "")[1].lower() not in (".csv", ".xlsx"):
+        return jsonify({"error": "The data file must be .csv or .xlsx."}), 400
+
+    # Prefixed so API jobs uploading files with the same names never share them
+    prefix = uuid.uuid4().hex[:12]
+    image_filename = secure_filename(f"{prefix}-{template.filename}")
+    data_filename = secure_filename(f"{prefix}-{data.filename}")
+    template.save(os.path.join(UPLOAD_FOLDER, image_filename))
+    data.save(os.path.join(UPLOAD_FOLDER, data_filename))
+    font_filename = save_uploaded_font(request.files.get("font_file")) or settings["font_filename"]
+
+    queued = enqueue_job(request.remote_addr, image_filename, data_filename, settings["headers_present"],
+                         settings["column_positions"], settings["font_sizes"], settings["file_column"],
+                         settings["output"], font_filename, max_widths=settings["max_widths"])
+    if queued is None:
+        _remove_uploads(image_filename, data_filename)
+        return jsonify({"error": "Too many certificate jobs are waiting; please try again shortly."}), 503
+    job_id, total_rows = queued
+    return jsonify({
+        "job_id": job_id,
+        "total": total_rows,
+        "queue_position": JOB_SCHEDULER.position(job_id),
+        **_api_job_links(job_id),
+    }), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job(job_id):
+    job = JOBS.get(job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify({"job_id": job_id, **_progress_payload(job_id, job), **_api_job_links(job_id)})
 
-    thread = threading.Thread(target=run_generation_job, args=(job_id, image_filename, data_filename, headers_present, column_positions, font_sizes, file_column), daemon=True)
-    thread.start()
 
-    return jsonify({"job_id": job_id, "total": total_rows})
+def _api_job_links(job_id):
+    return {
+        "status_url": url_for("api_job", job_id=job_id),
+        "events_url": url_for("progress_stream", job_id=job_id),
+        "download_url": url_for("download", job_id=job_id),
+    }
 
 
 @app.route("/progress/<job_id>", methods=["GET"])
 def progress(job_id):
-    with JOBS_LOCK:
-        job = JOBS.get(job_id)
+    job = JOBS.get(job_id)
     if not job:
         return jsonify({"error": "job not found"}), 404
-    return jsonify({
+    return jsonify(_progress_payload(job_id, job))
+
+
+def _progress_payload(job_id, job):
+    # Only a queued job's position and ETA need the queue scanned; a started job's ETA comes from its own counts
+    queued = job.get("status") == "queued"
+    return {
         "status": job.get("status", "running"),
         "completed": job.get("completed", 0),
+        "cached": job.get("cached", 0),
+        "rendered": job.get("completed", 0) - job.get("cached", 0),
         "total": job.get("total", 0),
         "error": job.get("error"),
-    })
+        "report": job.get("report"),
+        "timings": job.get("timings"),
+        "profile_url": job.get("profile_url"),
+        "queue_position": JOB_SCHEDULER.position(job_id) if queued else None,
+        "eta_seconds": JOB_SCHEDULER.eta(job_id, job),
+    }
+
+
+@app.route("/progress/<job_id>/stream", methods=["GET"])
+def progress_stream(job_id):
+    """Server-Sent Events version of /progress: one event per change, at most one per PROGRESS_STREAM_INTERVAL."""
+    if not JOBS.get(job_id):
+        return jsonify({"error": "job not found"}), 404
+
+    def events():
+        last = None
+        last_sent = 0.0
+        version = 0
+        while True:
+            job = JOBS.get(job_id)
+            if job is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            status = job.get("status", "running")
+            # The ETA drifts every call; only status and counts decide whether to send
+            position = JOB_SCHEDULER.position(job_id) if status == "queued" else None
+            state = (status, job.get("completed", 0), job.get("total", 0), position)
+            if state != last:
+                last = state
+                last_sent = time.time()
+                yield f"data: {json.dumps(_progress_payload(job_id, job))}\n\n"
+                if status in ("done", "error"):
+                    return
+                # Coalesce: whatever happens during the interval goes out as one event
+                time.sleep(PROGRESS_STREAM_INTERVAL)
+            elif time.time() - last_sent >= PROGRESS_STREAM_KEEPALIVE:
+                last_sent = time.time()
+                yield ": keepalive\n\n"
+            # Writes from this process wake us at once; the timeout picks up other processes' writes
+            version = JOBS.events.wait(version, timeout=1.0)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.route("/download/<job_id>", methods=["GET"])
 def download(job_id):
-    with JOBS_LOCK:
-        job = JOBS.get(job_id)
+    job = JOBS.get(job_id)
     if not job:
         return "Job not found", 404
+    # A job still queued or running is streamed as it renders; the download
+    # finishes when the job does
+    live = job.get("status") not in ("done", "error")
     output_dir = job.get("output_dir")
-    if not output_dir or not os.path.isdir(output_dir):
+    if not output_dir or not (live or os.path.isdir(output_dir)):
         return "No output available", 404
 
-    # Build zip in memory
-    zip_bytes = io.BytesIO()
-    with zipfile.ZipFile(zip_bytes, mode='w', compression=zipfile.ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(output_dir):
-            for f in files:
-                fp = os.path.join(root, f)
-                arcname = os.path.basename(fp)
-                zipf.write(fp, arcname=arcname)
-    zip_bytes.seek(0)
-
-    # Remove output directory now that zip is ready
+    def finish():
+        # An aborted live download leaves the job running; the janitor cleans up after it
+        final = JOBS.get(job_id) or job
+        if final.get("status") in ("done", "error"):
+            _cleanup_downloaded_job(job_id, job)
+
+    if (job.get("output") or {}).get("format") == "pdf":
+        pdf_path = os.path.join(output_dir, PDF_FILENAME)
+
+        def pdf_chunks():
+            try:
+                yield from _follow_file(job_id, pdf_path, live)
+            finally:
+                finish()
+
+        return Response(pdf_chunks(), mimetype="application/pdf",
+                        headers={"Content-Disposition": f"attachment; filename={PDF_FILENAME}"})
+
+    def chunks():
+        timings = Timings()
+        entries = _timed(_job_entries(job_id, output_dir, live), timings, "wait")
+        try:
+            for chunk in _timed(stream_zip(entries), timings, "download"):
+                METRICS.inc("certgen_download_bytes_total", len(chunk))
+                yield chunk
+        finally:
+            # Time spent waiting for a live job to render more is not archiving
+            zip_timings = Timings()
+            zip_timings.add("zip", timings.stages.get("download", 0.0) - timings.stages.get("wait", 0.0))
+            METRICS.add_timings(zip_timings)
+            finish()
+
+    return zip_response(chunks())
+
+
+def _wait_for_job(job_id, version):
+    """Sleep until the job store changes (or a second passes); returns (job, version)."""
+    version = JOBS.events.wait(version, timeout=1.0)
+    return JOBS.get(job_id), version
+
+
+def _job_entries(job_id, output_dir, live):
+    """Yield (arcname, path) for each finished certificate, waiting for more while the job runs."""
+    sent = set()
+    version = 0
+    while True:
+        job = JOBS.get(job_id) if live else None
+        finished = not live or job is None or job.get("status") in ("done", "error")
+        try:
+            names = sorted(os.listdir(output_dir))
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if name in sent or name.endswith(PARTIAL_SUFFIX):
+                continue
+            sent.add(name)
+            yield name, os.path.join(output_dir, name)
+        if finished:
+            if job is not None and job.get("status") == "error":
+                yield "ERROR.txt", f"Generation stopped early: {job.get('error')}\n".encode()
+            return
+        _, version = _wait_for_job(job_id, version)
+
+
+def _follow_file(job_id, path, live):
+    """Yield a file's bytes, following it as it grows until its job finishes (like tail -f)."""
+    version = 0
+    while live and not os.path.exists(path):
+        job, version = _wait_for_job(job_id, version)
+        if job is None or job.get("status") in ("done", "error"):
+            break
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(ZIP_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            if not live:
+                return
+            job, version = _wait_for_job(job_id, version)
+            # Whatever was flushed before the job finished is the rest of the file
+            live = job is not None and job.get("status") not in ("done", "error")
+
+
+def _cleanup_downloaded_job(job_id, job):
+    """Remove a job's outputs, uploads and registry entry once its archive was sent."""
+    output_dir = job.get("output_dir")
     try:
         shutil.rmtree(output_dir, ignore_errors=True)
     except Exception:
@@ -528,158 +2969,382 @@ def download(job_id):
 
     # Cleanup job
     try:
-        with JOBS_LOCK:
-            JOBS.pop(job_id, None)
+        JOBS.delete(job_id)
     except Exception:
         pass
 
-    return send_file(zip_bytes, mimetype='application/zip', as_attachment=True, download_name='certificates.zip')
+
+# Decoded, downscaled templates for previews, keyed by file stamp and width, so
+# repeated previews of one upload skip the decode and the resize
+_PREVIEW_TEMPLATES = OrderedDict()
+_PREVIEW_LOCK = threading.Lock()
+PREVIEW_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+
+def preview_template(image_path, max_width=PREVIEW_MAX_WIDTH):
+    """Template scaled to at most max_width pixels wide; returns (image, scale)."""
+    st = os.stat(image_path)
+    key = (image_path, st.st_mtime_ns, st.st_size, max_width)
+    with _PREVIEW_LOCK:
+        hit = _PREVIEW_TEMPLATES.get(key)
+        if hit is not None:
+            _PREVIEW_TEMPLATES.move_to_end(key)
+    METRICS.inc("certgen_cache_requests_total", cache="preview", result="miss" if hit is None else "hit")
+    if hit is not None:
+        return hit
+    if max_width < PREVIEW_MAX_WIDTH:
+        # Smaller sizes come from the cached largest preview, not the original
+        template, scale = preview_template(image_path)
+    else:
+        # JPEG/WebP previews have no use for alpha
+        template = load_template(image_path, "jpeg")
+        scale = 1.0
+    factor = min(1.0, max_width / template.width)
+    if factor < 1.0:
+        template = template.resize((max_width, max(1, round(template.height * factor))), Image.BILINEAR)
+        scale *= factor
+    hit = (template, scale)
+    with _PREVIEW_LOCK:
+        _PREVIEW_TEMPLATES[key] = hit
+        while len(_PREVIEW_TEMPLATES) > PREVIEW_CACHE_ITEMS:
+            _PREVIEW_TEMPLATES.popitem(last=False)
+    return hit
+
+
+def warm_preview(image_path):
+    """Decode and scale a fresh upload in the background while the options page loads."""
+    def run():
+        try:
+            preview_template(image_path)
+        except Exception:
+            pass
+    threading.Thread(target=run, daemon=True).start()
 
 
 @app.route("/preview", methods=["POST"])
 def preview():
-    """Render a preview using the first row of data for all mapped columns."""
+    """Render a display-sized preview of one data row (the `row` field, default the first) for all mapped columns."""
+    started = time.perf_counter()
     image_filename = request.form.get("image")
     data_filename = request.form.get("data_file")
     headers_present = request.form.get("headers_present") in ("true", "True", "1", "on", "yes")
 
-    img = Image.open(os.path.join(UPLOAD_FOLDER, image_filename))
-    img_w, img_h = img.size
+    try:
+        width = int(request.form.get("width") or PREVIEW_MAX_WIDTH)
+    except ValueError:
+        width = PREVIEW_MAX_WIDTH
+    width = max(64, min(width, PREVIEW_MAX_WIDTH))
+    img, scale = preview_template(os.path.join(UPLOAD_FOLDER, image_filename), width)
 
     # Build mapping from form
-    column_positions = {}
-    font_sizes = {}
+    column_positions, font_sizes = parse_column_settings(request.form)
+    max_widths = parse_max_widths(request.form)
     selected_font_filename = None
-    for key in request.form:
-        if key.startswith("pos_") and key.endswith("_x"):
-            col = key[len("pos_"):-2]
-            # robust parsing with defaults
-            try:
-                x = float(request.form.get(f"pos_{col}_x", 0.5))
-            except Exception:
-                x = 0.5
-            try:
-                y = float(request.form.get(f"pos_{col}_y", 0.5))
-            except Exception:
-                y = 0.5
-            try:
-                size = int(float(request.form.get(f"size_{col}", 40)))
-            except Exception:
-                size = 40
-            # clamp
-            x = 0 if x < 0 else (1 if x > 1 else x)
-            y = 0 if y < 0 else (1 if y > 1 else y)
-            size = max(1, size)
-            column_positions[col] = (x, y)
-            font_sizes[col] = size
 
     # Handle font selection/upload (preview)
     font_choice = request.form.get("font_choice")
     if font_choice == "other":
-        file = request.files.get("font_file")
-        if file and file.filename.lower().endswith('.ttf'):
-            fname = secure_filename(file.filename)
-            for d in FONTS_DIRS:
-                try:
-                    os.makedirs(d, exist_ok=True)
-                    file.save(os.path.join(d, fname))
-                    selected_font_filename = fname
-                    break
-                except Exception:
-                    continue
+        selected_font_filename = save_uploaded_font(request.files.get("font_file"))
     elif font_choice:
         selected_font_filename = font_choice
 
-    # Load first row of data if provided
+    # Load the requested row of data if provided (the parsed file is cached)
     first_row = None
     df = None
     if data_filename:
         data_path = os.path.join(UPLOAD_FOLDER, data_filename)
         if os.path.exists(data_path):
-            if data_filename.endswith(".csv"):
-                df = pd.read_csv(data_path, header=0 if headers_present else None)
-            else:
-                df = pd.read_excel(data_path, header=0 if headers_present else None)
-            # Use the next row after headers for preview when available
-            if headers_present and len(df) > 1:
-                first_row = df.iloc[1]
+            row = request.form.get("row")
+            if is_streamed(data_path):
+                # Large uploads are read chunk by chunk only as far as the requested row
+                try:
+                    index = int(row) if row not in (None, "") else (1 if headers_present else 0)
+                except ValueError:
+                    return "Row must be a number", 400
+                if index < 0:
+                    return "Row must be 0 or more", 400
+                for df in iter_dataset(data_path, headers_present):
+                    if index in df.index:
+                        first_row = df.loc[index]
+                        break
+                if first_row is None and row not in (None, ""):
+                    return f"Row {index} is past the end of the data", 400
             else:
-                first_row = df.iloc[0] if len(df) > 0 else None
+                df = load_dataset(data_filename, headers_present)
+                if row not in (None, ""):
+                    try:
+                        index = int(row)
+                    except ValueError:
+                        index = -1
+                    # iloc counts negative positions from the end; only real row numbers are accepted
+                    if not 0 <= index < len(df):
+                        return f"Row must be between 0 and {len(df) - 1}", 400
+                    first_row = df.iloc[index]
+                # Use the next row after headers for preview when available
+                elif headers_present and len(df) > 1:
+                    first_row = df.iloc[1]
+                else:
+                    first_row = df.iloc[0] if len(df) > 0 else None
 
     # Map displayed names back to df keys
     col_key_map = {str(c): c for c in df.columns} if df is not None else {}
 
-    base = img.copy()
-    draw = ImageDraw.Draw(base)
-    for col, (x_norm, y_norm) in column_positions.items():
+    layout = {
+        "column_positions": column_positions,
+        # Text shrinks with the template so the preview keeps the page's proportions
+        "font_sizes": {col: max(1, round(size * scale)) for col, size in font_sizes.items()},
+        "max_widths": max_widths,
+        "font_filename": selected_font_filename,
+    }
+    # Every configured column is drawn; the column name stands in for missing values
+    compiled = CompiledLayout(layout, img)
+    texts = []
+    for col in column_positions:
         sample = col
         if first_row is not None and df is not None and col in col_key_map:
             val = first_row[col_key_map[col]]
             if not pd.isna(val):
                 sample = str(val)
-        font = load_font(font_sizes.get(col, 40), selected_font_filename)
-        bbox = draw.textbbox((0, 0), sample, font=font)
-        text_w = bbox[2] - bbox[0]
-        text_h = bbox[3] - bbox[1]
-        x = int(x_norm * img_w - text_w / 2)
-        y = int(y_norm * img_h - (text_h / 2 + bbox[1]))
-        draw.text((x, y), sample, fill=(0, 0, 0, 255), font=font)
+        texts.append(sample)
+    base = render_certificate(img, compiled, texts)
 
     # Return preview directly from memory (avoid writing to disk)
+    pil_format, mimetype = PREVIEW_FORMATS.get(request.form.get("preview_format"), PREVIEW_FORMATS["jpeg"])
     output_bytes = io.BytesIO()
-    base.save(output_bytes, format='PNG')
+    base.save(output_bytes, format=pil_format, quality=85, method=0)
     output_bytes.seek(0)
 
-    return send_file(output_bytes, mimetype="image/png")
+    response = send_file(output_bytes, mimetype=mimetype)
+    response.headers["Server-Timing"] = f"render;dur={(time.perf_counter() - started) * 1000:.1f}"
+    return response
 
 
-def _cleanup_jobs_loop():
-    """Background janitor that removes finished or stale jobs and their outputs."""
-    while True:
-        now = time.time()
-        to_delete = []
-        with JOBS_LOCK:
-            for job_id, job in list(JOBS.items()):
-                status = job.get("status", "running")
-                updated = job.get("updated", job.get("created", now))
-                output_dir = job.get("output_dir")
-                if status in ("done", "error") and (now - updated) > JOB_TTL_SECONDS:
-                    to_delete.append((job_id, output_dir))
-                elif status == "running" and (now - updated) > JOB_STALE_SECONDS:
-                    # stale running job
-                    to_delete.append((job_id, output_dir))
-        # perform deletions outside lock
-        for job_id, output_dir in to_delete:
-            try:
-                if output_dir and os.path.isdir(output_dir):
-                    shutil.rmtree(output_dir, ignore_errors=True)
-            except Exception:
-                pass
-            # Also attempt to delete uploaded files for this job
-            try:
-                with JOBS_LOCK:
-                    job = JOBS.get(job_id)
-                    uploads = job.get("uploads", {}) if job else {}
-                img_name = uploads.get("image")
-                data_name = uploads.get("data")
-                if img_name:
-                    fp = os.path.join(UPLOAD_FOLDER, img_name)
-                    if os.path.exists(fp):
-                        os.remove(fp)
-                if data_name:
-                    fp = os.path.join(UPLOAD_FOLDER, data_name)
-                    if os.path.exists(fp):
-                        os.remove(fp)
-            except Exception:
-                pass
-            with JOBS_LOCK:
-                JOBS.pop(job_id, None)
-        time.sleep(60)
+@app.route("/profile/<job_id>", methods=["GET"])
+def job_profile(job_id):
+    """Collapsed-stack samples of a profiled job, for flamegraph.pl or speedscope."""
+    name = f"{secure_filename(job_id)}.txt"
+    if not os.path.isfile(os.path.join(PROFILE_FOLDER, name)):
+        return "Profile not found", 404
+    return send_from_directory(PROFILE_FOLDER, name, mimetype="text/plain")
 
 
-# Start background cleanup thread
-_janitor_thread = threading.Thread(target=_cleanup_jobs_loop, daemon=True)
-_janitor_thread.start()
+def _evict_profiles(now):
+    """Profiles are kept for JOB_STALE_SECONDS, long after their job's outputs are gone."""
+    try:
+        names = os.listdir(PROFILE_FOLDER)
+    except OSError:
+        return
+    for name in names:
+        fp = os.path.join(PROFILE_FOLDER, name)
+        try:
+            if (now - os.path.getmtime(fp)) > JOB_STALE_SECONDS:
+                os.remove(fp)
+        except OSError:
+            continue
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text exposition. Counters and timings are this process's own; with
+    several workers, scrape each one (or sum them) to cover the whole instance."""
+    counters, timings = METRICS.snapshot()
+    now = time.time()
+    running = [job for _, job in JOBS.items() if job.get("status") == "running"]
+    # Jobs in the shared store may belong to other processes; rows/sec is theirs too
+    rows_per_second = sum(
+        job.get("completed", 0) / (now - job["started"])
+        for job in running if job.get("started") and now > job["started"]
+    )
+    font = font_cache_stats()
+    lookups = {}
+    for (name, labels), value in counters.items():
+        if name == "certgen_cache_requests_total":
+            lookups[dict(labels)["cache"], dict(labels)["result"]] = value
+    # This process's own lookups, plus those made by render workers for their shards
+    lookups["font", "hit"] = font["hits"] + timings.counts.get("font_cache_hits", 0)
+    lookups["font", "miss"] = font["misses"] + timings.counts.get("font_cache_misses", 0)
+    if "text_sprite_hits" in timings.counts:
+        lookups["text_sprite", "hit"] = timings.counts["text_sprite_hits"]
+        lookups["text_sprite", "miss"] = timings.counts["text_sprite_misses"]
+
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            value = value if isinstance(value, int) else round(value, 6)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    def counted(name):
+        return sorted((labels, value) for (n, labels), value in counters.items() if n == name)
+
+    family("certgen_queue_depth", "gauge", "Jobs waiting in the queue.", [((), JOB_SCHEDULER.depth())])
+    family("certgen_jobs_active", "gauge", "Jobs rendering now.", [((), len(running))])
+    family("certgen_rows_per_second", "gauge", "Combined progress rate of the running jobs.", [((), rows_per_second)])
+    family("certgen_jobs_total", "counter", "Jobs finished, by outcome.", counted("certgen_jobs_total"))
+    family("certgen_rows_total", "counter", "Certificates produced, rendered or taken from the render cache.",
+           counted("certgen_rows_total"))
+    family("certgen_download_bytes_total", "counter", "Bytes of ZIP archives sent.",
+           counted("certgen_download_bytes_total"))
+    family("certgen_cache_requests_total", "counter", "Cache lookups, by cache and result.",
+           [((("cache", cache), ("result", result)), value) for (cache, result), value in sorted(lookups.items())])
+    ratios = []
+    for cache in sorted({cache for cache, _ in lookups}):
+        hits, misses = lookups.get((cache, "hit"), 0), lookups.get((cache, "miss"), 0)
+        if hits + misses:
+            ratios.append(((("cache", cache),), hits / (hits + misses)))
+    family("certgen_cache_hit_ratio", "gauge", "Share of cache lookups that hit.", ratios)
+    family("certgen_stage_seconds_total", "counter", "Time spent per pipeline stage.",
+           [((("stage", stage),), seconds) for stage, seconds in sorted(timings.stages.items())])
+    lines.append("# HELP certgen_row_render_seconds Time to render, encode and write one certificate.")
+    lines.append("# TYPE certgen_row_render_seconds histogram")
+    for bound, count in timings.cumulative_buckets():
+        lines.append(f'certgen_row_render_seconds_bucket{{le="{bound}"}} {count}')
+    lines.append(f"certgen_row_render_seconds_sum {round(timings.row_seconds, 6)}")
+    lines.append(f"certgen_row_render_seconds_count {sum(timings.buckets)}")
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+class JobExpiry:
+    """Deletes finished and stale jobs when they expire, sleeping until the next deadline.
+
+    Every job write in this process reports the job here, and its deadline goes
+    into a min-heap: JOB_TTL_SECONDS after it finished or JOB_STALE_SECONDS after a
+    running job's last progress write. Progress only moves a deadline later, so
+    the heap keeps the earliest one and the job is read again when it comes due;
+    if it is still alive, it goes back on the heap. Outputs and uploads are removed
+    on a small I/O pool, so a large output tree does not hold up the next deadline.
+
+    Every JOB_RECONCILE_SECONDS, and at start, a full scan picks up jobs that other
+    processes sharing JOB_STORE=sqlite wrote. The same scan reclaims files in
+    uploads/ and outputs/ that no job or queued job refers to, such as those left
+    by an earlier process. The dataset, render and profile caches are still swept
+    every CACHE_SWEEP_SECONDS.
+    """
+
+    def __init__(self, io_workers=2):
+        self._heap = []  # (deadline, job_id); an entry is live while it matches _deadlines
+        self._deadlines = {}
+        self._cond = threading.Condition()
+        self._io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="job-expiry")
+
+    @staticmethod
+    def deadline(job):
+        status = job.get("status", "running")
+        updated = job.get("updated", job.get("created", time.time()))
+        if status in ("done", "error"):
+            return updated + JOB_TTL_SECONDS
+        if status == "running":
+            return updated + JOB_STALE_SECONDS
+        return None  # queued jobs wait as long as the queue holds them
+
+    def watch(self, job_id, job):
+        """JobEvents listener: (re)schedule job_id if its deadline moved earlier."""
+        if job is None:
+            return  # deleted; its heap entry is dropped when it comes due
+        deadline = self.deadline(job)
+        if deadline is None:
+            return
+        with self._cond:
+            current = self._deadlines.get(job_id)
+            if current is not None and current <= deadline:
+                return
+            self._deadlines[job_id] = deadline
+            heapq.heappush(self._heap, (deadline, job_id))
+            if self._heap[0][1] == job_id:
+                self._cond.notify()
+
+    def start(self):
+        JOBS.events.listeners.append(self.watch)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        next_reconcile = next_sweep = 0.0
+        while True:
+            now = time.time()
+            if now >= next_reconcile:
+                next_reconcile = now + JOB_RECONCILE_SECONDS
+                self._safely(self.reconcile, now)
+            if now >= next_sweep:
+                next_sweep = now + CACHE_SWEEP_SECONDS
+                for evict in (_evict_dataset_cache, _evict_render_cache, _evict_profiles):
+                    self._safely(evict, now)
+            with self._cond:
+                due = None
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, job_id = heapq.heappop(self._heap)
+                    if self._deadlines.get(job_id) == deadline:
+                        del self._deadlines[job_id]
+                        due = job_id
+                        break
+                if due is None:
+                    wake = min(next_reconcile, next_sweep)
+                    if self._heap:
+                        wake = min(wake, self._heap[0][0])
+                    self._cond.wait(max(0.0, wake - now))
+                    continue
+            self._safely(self._expire, due)
+
+    @staticmethod
+    def _safely(fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            pass
+
+    def _expire(self, job_id):
+        job = JOBS.get(job_id)
+        if job is None:
+            return
+        deadline = self.deadline(job)
+        if deadline is not None and deadline > time.time():
+            self.watch(job_id, job)
+            return
+        # Claim the job first so only one worker process removes its files
+        job = JOBS.delete(job_id)
+        if job is not None:
+            self._io.submit(_remove_job_files, job)
+
+    def reconcile(self, now):
+        """Schedule every job in the store and reclaim the files no job refers to."""
+        jobs = JOBS.items()
+        for job_id, job in jobs:
+            self.watch(job_id, job)
+        jobs = [job for _, job in jobs] + JOB_SCHEDULER.queued_jobs()
+        uploads = {name for job in jobs for name in (job.get("uploads") or {}).values() if name}
+        outputs = {os.path.basename(job["output_dir"]) for job in jobs if job.get("output_dir")}
+        # Age limits cover files whose job is being created while we scan, and uploads
+        # still being laid out on the options page
+        for folder, referenced, max_age in ((OUTPUT_FOLDER, outputs, JOB_TTL_SECONDS),
+                                            (UPLOAD_FOLDER, uploads, JOB_STALE_SECONDS)):
+            for entry in os.scandir(folder):
+                if entry.name in referenced:
+                    continue
+                try:
+                    if now - entry.stat(follow_symlinks=False).st_mtime > max_age:
+                        self._io.submit(_remove_path, entry.path)
+                except OSError:
+                    pass
+
+
+def _remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def _remove_job_files(job):
+    output_dir = job.get("output_dir")
+    if output_dir and os.path.isdir(output_dir):
+        shutil.rmtree(output_dir, ignore_errors=True)
+    uploads = job.get("uploads") or {}
+    _remove_uploads(uploads.get("image"), uploads.get("data"))
+
+
+JOB_EXPIRY = JobExpiry()
 
 
 def _keepalive_loop():
@@ -696,9 +3361,59 @@ def _keepalive_loop():
         time.sleep(KEEPALIVE_INTERVAL_SECONDS)
 
 
-# Start keepalive thread if configured
-_keepalive_thread = threading.Thread(target=_keepalive_loop, daemon=True)
-_keepalive_thread.start()
+def start_background_threads():
+    """Start job expiry, the job workers (picking up jobs queued before a restart) and the keepalive."""
+    JOB_EXPIRY.start()
+    JOB_SCHEDULER.start()
+    threading.Thread(target=_keepalive_loop, daemon=True).start()
+
+
+def _warm_worker():
+    load_font(40)
+
+
+def warm_up():
+    """Load what LAZY_START put off: the heavy imports, the fonts and the render pool."""
+    for module in HEAVY_MODULES:
+        module.load()
+    for font_filename in [None] + list_available_fonts():
+        load_font(40, font_filename)
+    if RENDER_WORKERS > 1:
+        # Each worker imports the app and parses a font before the first job
+        pool = get_render_pool()
+        wait([pool.submit(_warm_worker) for _ in range(RENDER_WORKERS)])
+
+
+_first_request_seen = False
+_first_request_lock = threading.Lock()
+
+
+@app.before_request
+def _start_on_first_request():
+    global _first_request_seen
+    if not LAZY_START or _first_request_seen:
+        return
+    with _first_request_lock:
+        first, _first_request_seen = not _first_request_seen, True
+    if first:
+        # The threads are cheap to start, and queued jobs must not wait for the warm-up
+        if not HEADLESS:
+            start_background_threads()
+        g.warm_up = True
+
+
+@app.after_request
+def _warm_up_after_first_response(response):
+    if g.pop("warm_up", False):
+        response.call_on_close(lambda: threading.Thread(target=warm_up, daemon=True).start())
+    return response
+
+
+if not LAZY_START and not RENDER_WORKER:
+    for _module in HEAVY_MODULES:
+        _module.load()
+    if not HEADLESS:
+        start_background_threads()
 
 
 @app.route("/uploads/<path:filename>")
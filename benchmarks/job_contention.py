@@ -0,0 +1,107 @@
+"""Job-store contention under many concurrent jobs and progress pollers.
+
+Usage: python benchmarks/job_contention.py [jobs] [rows] [pollers]
+
+Runs `jobs` PDF generation jobs of `rows` rows at once (PDF pages are cheap, so
+progress updates dominate) while `pollers` threads hammer /progress, against
+both job stores. Each store is measured twice: publishing progress after every
+page (JOB_PROGRESS_INTERVAL=0, the old behaviour) and with the default batching.
+Prints job wall time, store writes and the poll rate the app sustained.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+os.environ["CERTGEN_HEADLESS"] = "1"
+import app  # noqa: E402
+from pipeline import FONT, synthetic_template  # noqa: E402
+
+
+class CountingStore:
+    """Wraps a job store and counts the writes made through it."""
+
+    def __init__(self, store):
+        self.store = store
+        self.writes = 0
+
+    def update(self, job_id, **fields):
+        self.writes += 1
+        return self.store.update(job_id, **fields)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def run(store, interval, jobs, rows, pollers, workdir, image, data):
+    app.JOBS = CountingStore(store)
+    app.JOB_PROGRESS_INTERVAL = interval
+    job_ids = []
+    for _ in range(jobs):
+        job_id = uuid.uuid4().hex
+        app.JOBS.create(job_id, {"status": "queued", "completed": 0, "total": rows, "created": time.time(),
+                                 "output_dir": os.path.join(workdir, job_id), "font_filename": FONT})
+        job_ids.append(job_id)
+
+    finished = threading.Event()
+    polls = [0] * pollers
+
+    def poll(n):
+        client = app.app.test_client()
+        while not finished.is_set():
+            client.get(f"/progress/{job_ids[polls[n] % jobs]}")
+            polls[n] += 1
+
+    output = {"format": "pdf", "compress_level": 6, "quality": 90}
+    threads = [threading.Thread(target=app.run_generation_job,
+                                args=(job_id, image, data, True, {"name": (0.5, 0.5)}, {"name": 60}, "name", output))
+               for job_id in job_ids]
+    poll_threads = [threading.Thread(target=poll, args=(n,)) for n in range(pollers)]
+    for thread in poll_threads:
+        thread.start()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    finished.set()
+    for thread in poll_threads:
+        thread.join()
+    for job_id in job_ids:
+        job = app.JOBS.delete(job_id)
+        assert job["status"] == "done", job.get("error")
+    return wall, app.JOBS.writes, sum(polls) / wall
+
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    pollers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    default_interval = app.JOB_PROGRESS_INTERVAL
+
+    image = f"bench-{uuid.uuid4().hex}.png"
+    data = f"bench-{uuid.uuid4().hex}.csv"
+    synthetic_template(1754, 1240).save(os.path.join(app.UPLOAD_FOLDER, image))
+    with open(os.path.join(app.UPLOAD_FOLDER, data), "w") as fh:
+        fh.write("name\n" + "".join(f"Participant {i:05d}\n" for i in range(rows)))
+
+    print(f"{jobs} jobs x {rows} rows, {pollers} pollers")
+    print(f"{'store':8} {'publish':>10} {'wall s':>8} {'writes':>8} {'polls/s':>9}")
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            stores = [("memory", app.MemoryJobStore), ("sqlite", lambda: app.SqliteJobStore(os.path.join(workdir, "jobs.db")))]
+            for name, make_store in stores:
+                for label, interval in (("per page", 0.0), (f"{default_interval:g}s", default_interval)):
+                    wall, writes, poll_rate = run(make_store(), interval, jobs, rows, pollers, workdir, image, data)
+                    print(f"{name:8} {label:>10} {wall:8.2f} {writes:8d} {poll_rate:9.0f}")
+    finally:
+        os.remove(os.path.join(app.UPLOAD_FOLDER, image))
+        os.remove(os.path.join(app.UPLOAD_FOLDER, data))
+
+
+if __name__ == "__main__":
+    main()
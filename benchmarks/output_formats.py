@@ -0,0 +1,55 @@
+"""Size/speed report for the certificate output encoders.
+
+Usage: python benchmarks/output_formats.py [template.png] [rows]
+
+Encodes the same rendered certificates with every output setting offered on the
+options page and prints the average encode time and file size of each, so an
+operator can pick the trade-off for a batch.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+os.environ["CERTGEN_HEADLESS"] = "1"
+import app  # noqa: E402
+from pipeline import FONT, synthetic_template  # noqa: E402
+
+SETTINGS = [
+    {"format": "png", "compress_level": 0, "quality": 90},
+    {"format": "png", "compress_level": 1, "quality": 90},
+    {"format": "png", "compress_level": 6, "quality": 90},
+    {"format": "png", "compress_level": 9, "quality": 90},
+    {"format": "jpeg", "compress_level": 6, "quality": 75},
+    {"format": "jpeg", "compress_level": 6, "quality": 90},
+    {"format": "webp", "compress_level": 6, "quality": 75},
+    {"format": "webp", "compress_level": 6, "quality": 90},
+]
+
+
+def main():
+    template_path = sys.argv[1] if len(sys.argv) > 1 else None
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    layout = {
+        "column_positions": {"name": (0.5, 0.45), "event": (0.5, 0.6)},
+        "font_sizes": {"name": 120, "event": 60},
+        "font_filename": FONT,
+    }
+    print(f"{'format':<8}{'level':>6}{'quality':>8}{'ms/cert':>10}{'KiB/cert':>10}")
+    for output in SETTINGS:
+        if template_path:
+            template = app.load_template(template_path, output["format"])
+        else:
+            template = synthetic_template(3508, 2480)
+        compiled = app.CompiledLayout(dict(layout, output=output), template)
+        pages = [app.render_certificate(template, compiled, (f"Participant {i:05d}", "DevFest 2026")) for i in range(rows)]
+        start = time.perf_counter()
+        nbytes = sum(len(app.encode_certificate(page, output)) for page in pages)
+        elapsed = (time.perf_counter() - start) / rows
+        level = output["compress_level"] if output["format"] == "png" else "-"
+        quality = output["quality"] if output["format"] != "png" else "-"
+        print(f"{output['format']:<8}{level:>6}{quality:>8}{elapsed * 1000:>10.1f}{nbytes / rows / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Benchmark suite for the certificate pipeline, with JSON output.
+
+Usage: python benchmarks/pipeline.py [--full] [--rows 10,1000] [--columns 1,3,10]
+           [--sizes 1754x1240,3508x2480] [--format png] [--mode region|full]
+           [--workers N] [--output results.json] [--baseline previous.json]
+
+Runs offline with the bundled fonts/ and synthetic templates and datasets. Each
+case (rows x columns x template size) runs in a fresh process, so its peak RSS is
+its own. The case renders through app.run_generation_job, as a queued web job
+does: render pool and sharding, render cache lookups and stores, progress
+writes to the job store. Then the output is streamed as a ZIP archive. The
+child imports app headless, with its job store and queue in memory and its
+uploads and caches in a temporary directory, so it starts cold and never
+touches the app's real queue.
+
+Stages come from the job's own timings (queue, template, parse, layout, cache,
+draw, encode, write, worker_setup); with the pool they add up worker time, so
+they can exceed the wall time. zip is the archive stream (app.stream_zip). The
+report holds rows/sec overall (job wall time plus zip) and per stage, exact
+p50/p99 per-row latency (the child asks the app to keep every row's render
+time, CERTGEN_ROW_SAMPLES), peak RSS of the job process and of the largest
+render worker, and archive size. With --baseline, rows/sec and p99 are compared
+case by case against an earlier report.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+QUICK = {"rows": [10, 100, 1000], "columns": [1, 3], "sizes": ["1754x1240"]}
+FULL = {"rows": [10, 1000, 10000, 100000], "columns": [1, 3, 10], "sizes": ["1280x905", "1754x1240", "3508x2480"]}
+FONT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "fonts", "Product Sans Regular.ttf"))
+
+
+def synthetic_template(width, height):
+    """A certificate-like page: soft gradient, double border and a seal, compressible like real templates."""
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    base = np.array([250, 244, 228], dtype=np.float32) - 24 * x * np.array([1, 1, 2]) - 12 * y
+    image = Image.fromarray(np.broadcast_to(base, (height, width, 3)).astype(np.uint8), "RGB")
+    draw = ImageDraw.Draw(image)
+    m = max(4, width // 40)
+    draw.rectangle((m, m, width - m, height - m), outline=(120, 90, 30), width=max(2, m // 4))
+    draw.rectangle((2 * m, 2 * m, width - 2 * m, height - 2 * m), outline=(170, 130, 50), width=max(1, m // 8))
+    r = height // 10
+    draw.ellipse((width - 4 * m - 2 * r, height - 4 * m - 2 * r, width - 4 * m, height - 4 * m), fill=(190, 40, 40))
+    return image
+
+
+def synthetic_rows(path, rows, columns):
+    rng = np.random.default_rng(rows * 31 + columns)
+    lengths = rng.integers(4, 28, size=(rows, columns))
+    with open(path, "w") as fh:
+        fh.write(",".join(f"col{c}" for c in range(columns)) + "\n")
+        for r in range(rows):
+            fh.write(",".join(f"R{r}C{c}-" + "x" * int(lengths[r, c]) for c in range(columns)) + "\n")
+
+
+def row_quantile_ms(samples, q):
+    """Quantile q of the per-row render times, in ms (linear interpolation); None without rows."""
+    if not samples:
+        return None
+    return round(float(np.quantile(samples, q)) * 1000, 3)
+
+
+def peak_rss_kb(pid):
+    """Peak RSS of a live process in KiB, from /proc (Linux); 0 where that is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def run_case(case, tmp):
+    """Run one benchmark case in this (fresh) process and return its result dict."""
+    os.environ["CERTGEN_HEADLESS"] = "1"
+    os.environ["CERTGEN_ROW_SAMPLES"] = "1"
+    os.environ["RENDER_MODE"] = case["mode"]
+    import app
+
+    for name in ("UPLOAD_FOLDER", "OUTPUT_FOLDER", "DATASET_CACHE_FOLDER", "RENDER_CACHE_FOLDER"):
+        folder = os.path.join(tmp, name.lower())
+        os.makedirs(folder)
+        setattr(app, name, folder)
+    app.RENDER_WORKERS = case["workers"]
+
+    width, height = (int(v) for v in case["size"].split("x"))
+    rows, columns = case["rows"], case["columns"]
+    output = {"format": case["format"], "compress_level": 6, "quality": 90}
+    synthetic_template(width, height).save(os.path.join(app.UPLOAD_FOLDER, "template.png"))
+    synthetic_rows(os.path.join(app.UPLOAD_FOLDER, "data.csv"), rows, columns)
+    positions = {f"col{c}": (0.5, (c + 1) / (columns + 1)) for c in range(columns)}
+    sizes = {f"col{c}": max(8, height // (3 * (columns + 1))) for c in range(columns)}
+
+    job_id = uuid.uuid4().hex
+    output_dir = os.path.join(app.OUTPUT_FOLDER, job_id)
+    start = time.perf_counter()
+    app.JOBS.create(job_id, {"status": "queued", "completed": 0, "total": 0, "created": time.time(),
+                             "output_dir": output_dir, "font_filename": FONT})
+    app.run_generation_job(job_id, "template.png", "data.csv", True, positions, sizes, "col0", output)
+    wall = time.perf_counter() - start
+    job = app.JOBS.delete(job_id)
+    if job["status"] != "done":
+        raise RuntimeError(job.get("error"))
+
+    archive = 0
+    start = time.perf_counter()
+    entries = ((name, os.path.join(output_dir, name)) for name in sorted(os.listdir(output_dir)))
+    for chunk in app.stream_zip(entries):
+        archive += len(chunk)
+    zip_seconds = time.perf_counter() - start
+
+    # Render workers come from a forkserver, not this process, so RUSAGE_CHILDREN never
+    # sees them; read their peak RSS before the pool shuts down
+    worker_rss_kb = 0
+    if app._RENDER_POOL is not None:
+        worker_rss_kb = max(map(peak_rss_kb, list(app._RENDER_POOL._processes)), default=0)
+        app._RENDER_POOL.shutdown(wait=True)
+    stages = dict(job["timings"]["stages"], zip=zip_seconds)
+    samples = job["timings"]["row_seconds"]["samples"]
+    return {
+        **case,
+        "rows_per_sec": round(rows / (wall + zip_seconds), 2),
+        "wall_seconds": round(wall + zip_seconds, 4),
+        "stages": {
+            name: {"seconds": round(seconds, 4), "rows_per_sec": round(rows / seconds, 2) if seconds > 0 else None}
+            for name, seconds in stages.items()
+        },
+        "latency_ms": {"p50": row_quantile_ms(samples, 0.5), "p99": row_quantile_ms(samples, 0.99)},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_worker_rss_mb": round(worker_rss_kb / 1024, 1),
+        "archive_bytes": archive,
+    }
+
+
+def case_key(result):
+    return (result["rows"], result["columns"], result["size"], result["format"], result["mode"], result.get("workers"))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as fh:
+        baseline = {case_key(r): r for r in json.load(fh)["results"]}
+    print(f"{'case':42} {'rows/s':>10} {'baseline':>10} {'change':>8} {'p99 ms':>9} {'baseline':>9} {'change':>8}",
+          file=sys.stderr)
+    for result in results:
+        old = baseline.get(case_key(result))
+        label = "{rows} rows x {columns} cols {size} {format}/{mode}".format(**result)
+        p99 = result["latency_ms"]["p99"]
+        if old is None:
+            print(f"{label:42} {result['rows_per_sec']:10.1f} {'-':>10} {'new':>8} {p99 or 0:9.2f}", file=sys.stderr)
+            continue
+        change = (result["rows_per_sec"] / old["rows_per_sec"] - 1) * 100
+        old_p99 = old["latency_ms"]["p99"]
+        p99_change = f"{(p99 / old_p99 - 1) * 100:+7.1f}%" if p99 and old_p99 else f"{'-':>8}"
+        print(f"{label:42} {result['rows_per_sec']:10.1f} {old['rows_per_sec']:10.1f} {change:+7.1f}% "
+              f"{p99 or 0:9.2f} {old_p99 or 0:9.2f} {p99_change}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--full", action="store_true", help="10 to 100k rows, 1-10 columns, three template sizes")
+    parser.add_argument("--rows", help="comma separated row counts")
+    parser.add_argument("--columns", help="comma separated mapped column counts")
+    parser.add_argument("--sizes", help="comma separated WIDTHxHEIGHT template sizes")
+    parser.add_argument("--format", default="png", choices=["png", "jpeg", "webp"])
+    parser.add_argument("--mode", default=os.environ.get("RENDER_MODE", "region"), choices=["region", "full"])
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("RENDER_WORKERS", os.cpu_count() or 1)),
+                        help="render processes (default: RENDER_WORKERS or the CPU count; 1 renders in the job thread)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare rows/sec against")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        with tempfile.TemporaryDirectory() as tmp:
+            print(json.dumps(run_case(json.loads(args.case), tmp)))
+        return
+
+    matrix = dict(FULL if args.full else QUICK)
+    if args.rows:
+        matrix["rows"] = [int(v) for v in args.rows.split(",")]
+    if args.columns:
+        matrix["columns"] = [int(v) for v in args.columns.split(",")]
+    if args.sizes:
+        matrix["sizes"] = args.sizes.split(",")
+
+    results = []
+    for size in matrix["sizes"]:
+        for columns in matrix["columns"]:
+            for rows in matrix["rows"]:
+                case = {"rows": rows, "columns": columns, "size": size, "format": args.format, "mode": args.mode,
+                        "workers": max(1, args.workers)}
+                # A fresh interpreter per case keeps peak RSS attributable to it
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+                                      capture_output=True, text=True, check=True)
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                print("{rows:>7} rows x {columns:>2} cols {size:>10}: {rows_per_sec:9.1f} rows/s, "
+                      "p99 {p99} ms, {peak_rss_mb} MB".format(**result, p99=result["latency_ms"]["p99"]),
+                      file=sys.stderr)
+                results.append(result)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
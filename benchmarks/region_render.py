@@ -0,0 +1,56 @@
+"""Compare full-frame and region rendering of certificates.
+
+Usage: python benchmarks/region_render.py [rows] [width] [height]
+
+Renders the same synthetic rows with the bundled fonts twice on pipeline.py's
+certificate-like template: once by copying and PNG-encoding the whole page, once
+with RegionEncoder. Prints the per-certificate time and output size of each, and
+region's speed-up and size cost relative to full-frame PNGs.
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+os.environ["CERTGEN_HEADLESS"] = "1"
+import app  # noqa: E402
+from pipeline import FONT, synthetic_template  # noqa: E402
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 3508
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 2480
+    template = synthetic_template(width, height)
+    layout = {
+        "column_positions": {"name": (0.5, 0.45), "event": (0.5, 0.6), "date": (0.8, 0.85)},
+        "font_sizes": {"name": 120, "event": 60, "date": 40},
+        "font_filename": FONT,
+    }
+    compiled = app.CompiledLayout(layout, template)
+    texts = [(f"Participant {i:05d}", "Google I/O Extended", "18 Oct 2026") for i in range(rows)]
+
+    start = time.perf_counter()
+    full_bytes = 0
+    for row in texts:
+        buf = io.BytesIO()
+        app.render_certificate(template, compiled, row).save(buf, format="PNG")
+        full_bytes += buf.tell()
+    full = (time.perf_counter() - start) / rows
+
+    encoder = app.RegionEncoder(template, compiled)
+    start = time.perf_counter()
+    region_bytes = 0
+    for row in texts:
+        region_bytes += len(encoder.encode(row))
+    region = (time.perf_counter() - start) / rows
+
+    print(f"template {width}x{height}, {rows} rows")
+    print(f"full   {full * 1000:8.1f} ms/cert  {full_bytes / rows / 1024:8.0f} KiB/cert")
+    print(f"region {region * 1000:8.1f} ms/cert  {region_bytes / rows / 1024:8.0f} KiB/cert  "
+          f"({full / region:.1f}x faster, {region_bytes / full_bytes - 1:+.1%} size)")
+
+
+if __name__ == "__main__":
+    main()
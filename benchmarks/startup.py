@@ -0,0 +1,126 @@
+"""Cold-start benchmark: import time and first-request latency, eager vs LAZY_START.
+
+Usage: python benchmarks/startup.py [--runs 5] [--think 2] [--output results.json]
+
+Each run starts a fresh interpreter, as a host waking a sleeping instance does,
+and measures:
+
+  import   import app (pandas, Pillow, openpyxl and background threads unless LAZY_START)
+  first    the first GET / after the import: what the wake-up request waits for
+  upload   the first upload (POST / with a template and a CSV), sent --think
+           seconds after the first response, as a user picking files would
+
+The first response is closed explicitly, as a WSGI server does, so LAZY_START's
+warm-up starts. Medians over --runs are reported per mode, as a table on stderr
+and as JSON. Imports are measured with a warm OS file cache; a truly cold disk
+adds to both modes.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, os.pardir)))
+MODES = {"eager": "0", "lazy": "1"}
+
+
+def run_child(template_path, data_path, think):
+    """One cold start in this (fresh) process; returns its timings."""
+    start = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+
+    client = app.app.test_client()
+    t0 = time.perf_counter()
+    response = client.get("/")
+    first = time.perf_counter() - t0
+    assert response.status_code == 200, response.status_code
+    response.close()
+
+    time.sleep(think)
+    name = uuid.uuid4().hex
+    with open(template_path, "rb") as image, open(data_path, "rb") as data:
+        t0 = time.perf_counter()
+        response = client.post("/", data={"file": (data, f"{name}.csv"), "image": (image, f"{name}.png"),
+                                          "headers_present": "on"}, content_type="multipart/form-data")
+        upload = time.perf_counter() - t0
+    assert response.status_code == 200, response.status_code
+    for ext in (".csv", ".png"):
+        os.remove(os.path.join(app.UPLOAD_FOLDER, name + ext))
+    return {"import": imported - start, "first": first, "upload": upload}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=HERE).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per mode")
+    parser.add_argument("--think", type=float, default=2.0, help="seconds between the first response and the upload")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(*args.child, args.think)))
+        return
+
+    from pipeline import synthetic_template
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.path.join(tmp, "template.png")
+        data_path = os.path.join(tmp, "data.csv")
+        synthetic_template(1754, 1240).save(template_path)
+        with open(data_path, "w") as fh:
+            fh.write("name,event\n" + "".join(f"Participant {i:05d},DevFest\n" for i in range(500)))
+
+        for mode, lazy in MODES.items():
+            runs = []
+            for n in range(args.runs):
+                # A private job store keeps the eager mode's queue workers off the app's real queue
+                env = dict(os.environ, LAZY_START=lazy, JOB_STORE="memory",
+                           JOB_STORE_PATH=os.path.join(tmp, f"jobs-{mode}-{n}.sqlite3"))
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--think", str(args.think),
+                                       "--child", template_path, data_path],
+                                      env=env, capture_output=True, text=True, check=True)
+                runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            results[mode] = {key: round(statistics.median(run[key] for run in runs), 4) for key in runs[0]}
+
+    print(f"{'mode':6} {'import s':>9} {'first s':>8} {'upload s':>9}", file=sys.stderr)
+    for mode, result in results.items():
+        print(f"{mode:6} {result['import']:9.3f} {result['first']:8.3f} {result['upload']:9.3f}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "runs": args.runs,
+            "think_seconds": args.think,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Generate certificates from the command line, without the web app.
+
+Usage: python cli.py LAYOUT [LAYOUT ...] -o OUTPUT [--template IMAGE] [--data FILE] [--workers N]
+
+LAYOUT is a saved layout: the JSON the "Save layout" button on the options page
+downloads. It may also name its "template" and "data" files (relative to the
+layout file); --template and --data override them.
+
+OUTPUT is a directory, a .zip archive or, for PDF output, a .pdf file. With
+several layouts it must contain {name}, which is replaced by each layout's file
+name without its extension:
+
+  python cli.py events/*.json -o nightly/{name}.zip --workers 8
+
+Rendering is the web app's own (run_generation_job), so the render pool, the
+render cache and RENDER_MODE behave as they do there, but nothing is queued,
+polled or deleted afterwards. Headless, the app keeps jobs and its queue in
+memory, and the dataset and render caches are trimmed after each layout, as the
+web app's janitor would.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+os.environ["CERTGEN_HEADLESS"] = "1"
+import app  # noqa: E402
+
+
+def _resolve(path, base):
+    if not path:
+        return None
+    return os.path.abspath(path if os.path.isabs(path) else os.path.join(base, path))
+
+
+def write_archive(work_dir, output):
+    tmp = output + app.PARTIAL_SUFFIX
+    entries = ((name, os.path.join(work_dir, name)) for name in sorted(os.listdir(work_dir)))
+    with open(tmp, "wb") as f:
+        for chunk in app.stream_zip(entries):
+            f.write(chunk)
+    os.replace(tmp, output)
+
+
+def run(layout_path, output, template=None, data=None, progress=None):
+    """Render one saved layout into output; returns the finished job entry."""
+    with open(layout_path) as f:
+        spec = json.load(f)
+    settings = app.parse_layout(spec)
+    base = os.path.dirname(os.path.abspath(layout_path))
+    template = _resolve(template, os.getcwd()) or _resolve(spec.get("template"), base)
+    data = _resolve(data, os.getcwd()) or _resolve(spec.get("data"), base)
+    if not template or not data:
+        raise ValueError("no template or data file; pass --template/--data or name them in the layout")
+    for path in (template, data):
+        if not os.path.isfile(path):
+            raise ValueError(f"{path}: no such file")
+
+    single_file = output.endswith(".zip") or (output.endswith(".pdf") and settings["output"]["format"] == "pdf")
+    if single_file:
+        parent = os.path.dirname(os.path.abspath(output))
+        os.makedirs(parent, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=".certgen-", dir=parent)
+    else:
+        work_dir = output
+        os.makedirs(work_dir, exist_ok=True)
+
+    job_id = uuid.uuid4().hex
+    app.JOBS.create(job_id, {"status": "queued", "completed": 0, "total": 0, "created": time.time(),
+                             "output_dir": work_dir, "font_filename": settings["font_filename"]})
+    try:
+        worker = threading.Thread(target=app.run_generation_job, daemon=True, args=(
+            job_id, template, data, settings["headers_present"], settings["column_positions"],
+            settings["font_sizes"], settings["file_column"], settings["output"], settings["max_widths"],
+        ))
+        worker.start()
+        version = 0
+        while worker.is_alive():
+            # The job's own progress writes wake us up
+            version = app.JOBS.events.wait(version, timeout=1.0)
+            if progress is not None:
+                progress(app.JOBS.get(job_id))
+        job = app.JOBS.delete(job_id)
+        if single_file and job["status"] == "done":
+            if output.endswith(".zip"):
+                write_archive(work_dir, output)
+            else:
+                os.replace(os.path.join(work_dir, app.PDF_FILENAME), output)
+        return job
+    finally:
+        if single_file:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        now = time.time()
+        app._evict_dataset_cache(now)
+        app._evict_render_cache(now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("layouts", nargs="+", metavar="LAYOUT", help="saved layout JSON file(s)")
+    parser.add_argument("-o", "--output", required=True,
+                        help="output directory, .zip or .pdf; {name} stands for the layout's name")
+    parser.add_argument("--template", help="template image (overrides the layout's)")
+    parser.add_argument("--data", help=".csv or .xlsx dataset (overrides the layout's)")
+    parser.add_argument("--workers", type=int, default=app.RENDER_WORKERS,
+                        help=f"render processes (default {app.RENDER_WORKERS}; 1 renders in this process)")
+    args = parser.parse_args()
+    if len(args.layouts) > 1 and "{name}" not in args.output:
+        parser.error("with several layouts, --output must contain {name}")
+    app.RENDER_WORKERS = max(1, args.workers)
+
+    interactive = sys.stderr.isatty()
+    failed = 0
+    for layout_path in args.layouts:
+        name = os.path.splitext(os.path.basename(layout_path))[0]
+        output = args.output.replace("{name}", name)
+
+        def progress(job):
+            if interactive and job:
+                print(f"\r{name}: {job.get('completed', 0)}/{job.get('total', 0)}", end="", file=sys.stderr)
+
+        started = time.time()
+        try:
+            job = run(layout_path, output, args.template, args.data, progress)
+        except (OSError, ValueError) as e:
+            job = {"status": "error", "error": str(e)}
+        if interactive:
+            print("\r\033[K", end="", file=sys.stderr)
+        if job["status"] != "done":
+            failed += 1
+            print(f"{name}: failed: {job.get('error')}", file=sys.stderr)
+            continue
+        print(f"{name}: {job['completed']} certificates ({job.get('cached', 0)} from cache) "
+              f"in {time.time() - started:.1f}s -> {output}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Import app without background threads and with its job queue in memory
+os.environ["CERTGEN_HEADLESS"] = "1"
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
@@ -0,0 +1,65 @@
+"""The TrueType cmap reader and the PDF writer."""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import app
+
+FONTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "fonts"))
+FONT_FILES = sorted(name for name in os.listdir(FONTS_DIR) if name.lower().endswith(".ttf"))
+NAMES = ["Pérson (#3) \\ x", "Иван Петров", "Ελένη Παπαδοπούλου", "Zoë Ångström-Łukasz"]
+
+
+def read_font(name):
+    with open(os.path.join(FONTS_DIR, name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("font_name", FONT_FILES)
+def test_cmap_matches_mupdf(font_name):
+    fitz = pytest.importorskip("fitz")
+    data = read_font(font_name)
+    cmap = app.TrueTypeCmap(data)
+    reference = fitz.Font(fontbuffer=data)
+    # The whole BMP and the supplementary planes fonts commonly map
+    for code in range(0x30000):
+        if 0xD800 <= code <= 0xDFFF:
+            continue
+        assert cmap.glyph(code) == reference.has_glyph(code), hex(code)
+
+
+def write_pdf(texts_by_page, font_name="Arial.TTF", size=(842, 595)):
+    template = Image.new("RGB", size, (250, 244, 228))
+    layout = {
+        "column_positions": {"name": (0.5, 0.4), "event": (0.5, 0.7)},
+        "font_sizes": {"name": 40, "event": 24},
+        "font_filename": os.path.join(FONTS_DIR, font_name),
+        "output": {"format": "pdf", "compress_level": 6, "quality": 90},
+    }
+    compiled = app.CompiledLayout(layout, template)
+    out = io.BytesIO()
+    pages = list(app.write_pdf(template, compiled, ((f"{i}.pdf", texts) for i, texts in enumerate(texts_by_page)), out))
+    return out.getvalue(), pages
+
+
+@pytest.mark.parametrize("font_name", ["Arial.TTF", "Calibri.ttf"])
+def test_pdf_parses_and_text_extracts(font_name):
+    pypdf = pytest.importorskip("pypdf")
+    data, pages = write_pdf([(name, "DevFest") for name in NAMES] + [(None, "DevFest")], font_name)
+    assert sum(nbytes for _, nbytes, _ in pages) <= len(data)
+
+    reader = pypdf.PdfReader(io.BytesIO(data), strict=True)
+    assert len(reader.pages) == len(NAMES) + 1
+    for page, name in zip(reader.pages, NAMES):
+        text = page.extract_text()
+        assert name in text
+        assert "DevFest" in text
+        assert float(page.mediabox.width) == pytest.approx(842 * 0.75, abs=0.01)
+    assert reader.pages[-1].extract_text().strip() == "DevFest"
+
+
+def test_pdf_rejects_text_the_font_cannot_show():
+    with pytest.raises(ValueError, match="no glyph"):
+        write_pdf([("李小龍", "DevFest")])
@@ -0,0 +1,65 @@
+"""RegionEncoder output must be pixel-identical to full-frame rendering."""
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app
+
+FONT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "fonts", "Product Sans Regular.ttf"))
+
+# Column positions (fractions of the template) and the texts drawn there
+PLACEMENTS = {
+    "centre": ({"name": (0.5, 0.5)}, ("Participant 00042",)),
+    "corners": ({"top": (0.0, 0.0), "bottom": (1.0, 1.0)}, ("Top left overflowing", "Bottom right overflowing")),
+    "tile boundary": ({"name": (0.5, app.REGION_TILE_ROWS * 3 / 301)}, ("Crosses a tile edge",)),
+    "far apart": ({"first": (0.3, 0.02), "last": (0.7, 0.98)}, ("First tile", "Last tile")),
+    "one missing": ({"name": (0.5, 0.4), "event": (0.5, 0.7)}, ("Only the name", None)),
+    "nothing drawn": ({"name": (0.5, 0.5)}, (None,)),
+}
+
+
+def make_template(mode, width=403, height=301):
+    """A gradient with noise; odd dimensions so the last tile is a partial one."""
+    rng = np.random.default_rng(7)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    channels = [x + 0 * y, y + 0 * x, (x + y) / 2, 255 - y + 0 * x][:len(mode)]
+    arr = np.stack(channels, axis=-1) + rng.integers(0, 16, (height, width, len(mode)))
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8), mode)
+
+
+def make_layout(positions, compress_level=6):
+    return {
+        "column_positions": positions,
+        "font_sizes": {col: 28 for col in positions},
+        "font_filename": FONT,
+        "output": {"format": "png", "compress_level": compress_level, "quality": 90},
+    }
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+@pytest.mark.parametrize("placement", list(PLACEMENTS))
+def test_region_output_matches_full_frame(mode, placement):
+    positions, texts = PLACEMENTS[placement]
+    template = make_template(mode)
+    compiled = app.CompiledLayout(make_layout(positions), template)
+    encoder = app.RegionEncoder(template, compiled)
+
+    decoded = Image.open(io.BytesIO(encoder.encode(texts)))
+    expected = app.render_certificate(template, compiled, texts)
+    assert decoded.mode == expected.mode
+    assert decoded.size == expected.size
+    assert decoded.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("compress_level", [0, 1, 9])
+def test_region_reuses_clean_tiles_across_rows(compress_level):
+    template = make_template("RGB")
+    compiled = app.CompiledLayout(make_layout({"name": (0.5, 0.5)}, compress_level), template)
+    encoder = app.RegionEncoder(template, compiled, compress_level)
+    for texts in [("First row",), ("A much longer second row",), ("",), ("Third",)]:
+        decoded = Image.open(io.BytesIO(encoder.encode(texts)))
+        assert decoded.tobytes() == app.render_certificate(template, compiled, texts).tobytes()